@@ -0,0 +1,41 @@
+"""Compare loading a password store by parsing it against loading its compiled cache.
+
+Usage: python bench/bench_cache.py [NUM_ENTRIES]
+"""
+
+import os.path, sys, tempfile, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw import _cache
+from pw.store import Store
+from synthetic import generate
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as dirname:
+        path = os.path.join(dirname, "db.pw")
+        with open(path, "w") as fp:
+            fp.write(generate(n))
+        Store.load(path, cache=True)  # create cache
+        assert list(Store.load(path, cache=True).entries) == Store.load(path).entries
+
+        t_parse = min(timeit.repeat(lambda: Store.load(path), number=1, repeat=3))
+        t_compact = min(
+            timeit.repeat(lambda: Store.load(path, compact=True), number=1, repeat=3)
+        )
+        t_cache = min(
+            timeit.repeat(lambda: Store.load(path, cache=True), number=1, repeat=3)
+        )
+        print("entries:        %d" % n)
+        print(
+            "cache size:     %.1f MB" % (os.path.getsize(_cache.cache_path(path)) / 1e6)
+        )
+        print("parse:          %.3fs" % t_parse)
+        print("parse, compact: %.3fs" % t_compact)
+        print("cache:          %.3fs" % t_cache)
+        print("speedup:        %.1fx" % (t_parse / t_cache))
+
+
+if __name__ == "__main__":
+    main()
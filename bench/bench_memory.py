@@ -0,0 +1,58 @@
+"""Compare load time, memory usage and search time of regular, compact and lazy stores.
+
+Usage: python bench/bench_memory.py [NUM_ENTRIES]
+"""
+
+import os.path, sys, time, timeit, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw._compact import LazyEntries
+from pw.store import _iter_lazy_records, _parse_entries, Store
+from synthetic import generate
+
+
+def measure(load, n):
+    src = generate(n)
+    start = time.perf_counter()
+    load(src)
+    elapsed = time.perf_counter() - start
+
+    # the source is kept alive by the lazy store, so it counts towards its memory usage
+    tracemalloc.start()
+    store = load(generate(n))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, elapsed, size
+
+
+BACKENDS = [
+    ("regular", lambda src: Store("", _parse_entries(src))),
+    ("compact", lambda src: Store("", _parse_entries(src), compact=True)),
+    ("lazy", lambda src: Store("", LazyEntries(src, _iter_lazy_records(src)))),
+]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    stores = {}
+    print("entries: %d" % n)
+    for name, load in BACKENDS:
+        store, elapsed, size = measure(load, n)
+        stores[name] = store
+        print("%-8s load: %6.2fs  memory: %7.1f MB" % (name, elapsed, size / 1e6))
+    assert list(stores["compact"].entries) == stores["regular"].entries
+    assert list(stores["lazy"].entries) == stores["regular"].entries
+
+    for key_pattern, user_pattern in [("mail.bank1", ""), ("", "user7@"), ("", "")]:
+        line = "%-20r" % ((key_pattern, user_pattern),)
+        for name, store in stores.items():
+            t = min(
+                timeit.repeat(lambda: store.search(key_pattern, user_pattern), number=1)
+            )
+            line += "  %s: %8.2fms" % (name, 1e3 * t)
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare memory usage of loading a large unencrypted password store regularly, lazily and memory-mapped.
+
+Each variant runs in a separate process. Besides the load time, it reports the Python heap after
+loading (as traced by tracemalloc, which does not include memory-mapped pages) and the peak
+resident set size (which does include the pages of the memory-mapped file that have been read,
+although these can be reclaimed by the operating system at any time).
+
+Usage: python bench/bench_mmap.py [SIZE_IN_MB]
+"""
+
+import os.path, resource, subprocess, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw._compact import LazyEntries
+from pw.store import _iter_lazy_records, _load_source, Store
+from synthetic import generate
+
+
+def load_decoded(path):
+    src = _load_source(path)
+    return Store(path, LazyEntries(src, _iter_lazy_records(src)))
+
+
+VARIANTS = {
+    "regular": lambda path: Store.load(path),
+    "lazy (decoded)": lambda path: load_decoded(path),
+    "lazy (mmap)": lambda path: Store.load(path, lazy=True),
+}
+
+
+def child(variant, path, trace):
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    store = VARIANTS[variant](path)
+    elapsed = time.perf_counter() - start
+    store.search("mail", "user1@")
+    if trace:
+        print(tracemalloc.get_traced_memory()[0])
+    else:
+        print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def run(variant, path, trace):
+    args = [sys.executable, __file__, "--child", variant, path] + (
+        ["trace"] if trace else []
+    )
+    return [float(x) for x in subprocess.check_output(args).split()]
+
+
+def main():
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    n = int(size * 1e6 * 1000 / len(generate(1000)))
+    with tempfile.TemporaryDirectory() as dirname:
+        path = os.path.join(dirname, "db.pw")
+        with open(path, "w") as fp:
+            for i in range(0, n, 100000):
+                fp.write(generate(min(100000, n - i), seed=i))
+        print("file size: %.0f MB, entries: %d" % (os.path.getsize(path) / 1e6, n))
+        print("%-16s %8s %12s %12s" % ("variant", "load", "heap", "peak RSS"))
+        for variant in VARIANTS:
+            elapsed, rss = run(variant, path, trace=False)
+            (heap,) = run(variant, path, trace=True)
+            print(
+                "%-16s %7.2fs %10.0f MB %10.0f MB"
+                % (variant, elapsed, heap / 1e6, rss / 1e6)
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3], trace=len(sys.argv) > 4)
+    else:
+        main()
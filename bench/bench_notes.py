@@ -0,0 +1,26 @@
+"""Check that parsing time grows linearly with the length of a notes block.
+
+Usage: python bench/bench_notes.py [MAX_NOTES_LINES]
+"""
+
+import os.path, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw.store import _parse_entries
+from synthetic import generate
+
+
+def main():
+    max_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print("%12s %10s %14s" % ("notes lines", "time", "per line"))
+    notes_lines = 1000
+    while notes_lines <= max_lines:
+        src = generate(3, notes_lines=notes_lines)
+        t = min(timeit.repeat(lambda: _parse_entries(src), number=1, repeat=3))
+        per_line = t / (3 * notes_lines)
+        print("%12d %9.3fs %12.0fns" % (notes_lines, t, per_line * 1e9))
+        notes_lines *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare the entry tokenizer against the shlex-based parser of pw 0.14.1 (and parallel parsing).
+
+Usage: python bench/bench_parse.py [NUM_ENTRIES]
+"""
+
+from io import StringIO
+from shlex import shlex
+import os.path, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw.store import _parse_entries, _parse_entries_parallel, Entry
+from synthetic import generate
+
+
+def parse_entries_shlex(src):
+    entries = []
+    for line in src.splitlines():
+        sline = line.strip()
+        if not sline or line.startswith("#"):
+            continue
+        if line[0] in [" ", "\t"]:
+            notes = entries[-1].notes
+            if notes:
+                notes += "\n"
+            entries[-1] = entries[-1]._replace(notes=notes + sline)
+            continue
+        sio = StringIO(line)
+        lexer = shlex(sio, posix=True)
+        lexer.whitespace_split = True
+        key = lexer.get_token().rstrip(":")
+        user = lexer.get_token()
+        password = lexer.get_token()
+        if not password:
+            entries.append(Entry(key, "", user, ""))
+        else:
+            entries.append(Entry(key, user, password, sio.read().strip()))
+    return entries
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    src = generate(n)
+    assert _parse_entries(src) == parse_entries_shlex(src)
+
+    t_shlex = min(timeit.repeat(lambda: parse_entries_shlex(src), number=1, repeat=3))
+    t_fast = min(timeit.repeat(lambda: _parse_entries(src), number=1, repeat=3))
+    print("entries:   %d" % n)
+    print("shlex:     %.3fs" % t_shlex)
+    print("tokenizer: %.3fs" % t_fast)
+    print("speedup:   %.1fx" % (t_shlex / t_fast))
+
+    # parsing in a process pool only pays off with several CPUs
+    assert _parse_entries_parallel(src) == _parse_entries(src)
+    t_parallel = min(
+        timeit.repeat(lambda: _parse_entries_parallel(src), number=1, repeat=3)
+    )
+    print("parallel:  %.3fs (%d CPUs)" % (t_parallel, os.cpu_count() or 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare regex and wildcard searches with literal prefiltering to matching every key.
+
+Usage: python bench/bench_patterns.py [NUM_ENTRIES]
+"""
+
+import fnmatch, os.path, re, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw.store import _parse_entries, Store
+from synthetic import generate
+
+QUERIES = [
+    ("^mail\\.bank1234", False),
+    ("vpn\\.wiki\\d+5$", False),
+    ("(cloud|backup)\\.db", False),
+    ("nonexistent.*", False),
+    ("mail.bank1234*", True),
+    ("*.wiki*5", True),
+]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    store = Store("", _parse_entries(generate(n)))
+    indexed = Store("", store.entries, index=True)
+    keys = list(store.keys)
+
+    print("entries: %d" % n)
+    for pattern, glob in QUERIES:
+        regex = re.compile(fnmatch.translate(pattern) if glob else pattern, re.I)
+        match = regex.match if glob else regex.search
+        expected = [idx for idx, key in enumerate(keys) if match(key)]
+        for s in (store, indexed):
+            got = s.search(pattern, "", regex=not glob, glob=glob)
+            assert [e.key for e in got] == [keys[idx] for idx in expected]
+
+        t_all = min(
+            timeit.repeat(
+                lambda: [idx for idx, key in enumerate(keys) if match(key)],
+                number=1,
+                repeat=3,
+            )
+        )
+        t_scan, t_index = (
+            min(
+                timeit.repeat(
+                    lambda: s.search(pattern, "", regex=not glob, glob=glob),
+                    number=1,
+                    repeat=3,
+                )
+            )
+            for s in (store, indexed)
+        )
+        print(
+            "%-24r every key: %8.2fms  prefiltered: %8.2fms  with index: %8.2fms"
+            % (pattern, 1e3 * t_all, 1e3 * t_scan, 1e3 * t_index)
+        )
+
+
+if __name__ == "__main__":
+    main()
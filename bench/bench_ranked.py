@@ -0,0 +1,54 @@
+"""Measure latency of ranked (fuzzy) searches, compared to substring searches.
+
+Usage: python bench/bench_ranked.py [NUM_ENTRIES] [LIMIT]
+"""
+
+import os.path, sys, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw.store import _parse_entries, Store
+from synthetic import generate
+
+QUERIES = [
+    ("mail.bank12345", ""),
+    ("bank", ""),
+    ("vpn", "user7@"),
+    ("mbk", ""),
+    ("c", ""),
+    ("", "user12@"),
+    ("nonexistent", ""),
+]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    store = Store("", _parse_entries(generate(n)))
+
+    print("entries: %d, limit: %d" % (n, limit))
+    for key_pattern, user_pattern in QUERIES:
+        t_search = min(
+            timeit.repeat(
+                lambda: store.search(key_pattern, user_pattern), number=1, repeat=3
+            )
+        )
+        t_ranked = min(
+            timeit.repeat(
+                lambda: store.search_ranked(key_pattern, user_pattern, limit=limit),
+                number=1,
+                repeat=3,
+            )
+        )
+        print(
+            "%-30r substring: %8.2fms (%7d results)  ranked: %8.2fms"
+            % (
+                (key_pattern, user_pattern),
+                1e3 * t_search,
+                len(store.search(key_pattern, user_pattern)),
+                1e3 * t_ranked,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Measure reloading a password file after changing a single password, with a full and an incremental reparse.
+
+Usage: python bench/bench_reparse.py
+"""
+
+import os.path, shutil, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw.store import Store
+from synthetic import generate
+
+SIZES = [10000, 100000, 1000000]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    dirname = tempfile.mkdtemp()
+    try:
+        for n in SIZES:
+            path = os.path.join(dirname, "store-%d.pw" % n)
+            src = generate(n)
+            with open(path, "w") as fp:
+                fp.write(src)
+            store = Store.load(path, index=True, incremental=True)
+
+            # change the password of the entry in the middle of the file
+            line_start = src.rindex("\n", 0, len(src) // 2) + 1
+            line_end = src.index("\n", line_start)
+            with open(path, "w") as fp:
+                fp.write(
+                    src[:line_start] + src[line_start:line_end] + "x" + src[line_end:]
+                )
+
+            _, full = timed(lambda: Store.load(path, index=True))
+            reloaded, incremental = timed(store.reload)
+            assert reloaded.index is store.index
+            print(
+                "%8d entries  full: %8.2fms  incremental: %8.2fms"
+                % (n, 1e3 * full, 1e3 * incremental)
+            )
+    finally:
+        shutil.rmtree(dirname)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare searches with and without n-gram index.
+
+Usage: python bench/bench_search.py [NUM_ENTRIES]
+"""
+
+import os.path, sys, time, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw.store import _parse_entries, Store
+from synthetic import generate
+
+QUERIES = [
+    ("mail.bank12345", ""),
+    ("vpn.wiki", ""),
+    ("", "user7@"),
+    ("cloud", "user12@example"),
+    ("nonexistent", ""),
+    ("ci", ""),
+]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    entries = _parse_entries(generate(n))
+
+    start = time.perf_counter()
+    store = Store("", entries)
+    t_init = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = Store("", entries, index=True)
+    t_init_indexed = time.perf_counter() - start
+
+    print("entries: %d" % n)
+    print("build: %.3fs without index, %.3fs with index" % (t_init, t_init_indexed))
+    for key_pattern, user_pattern in QUERIES:
+        assert store.search(key_pattern, user_pattern) == indexed.search(
+            key_pattern, user_pattern
+        )
+        t_scan = min(
+            timeit.repeat(
+                lambda: store.search(key_pattern, user_pattern), number=1, repeat=3
+            )
+        )
+        t_index = min(
+            timeit.repeat(
+                lambda: indexed.search(key_pattern, user_pattern), number=1, repeat=3
+            )
+        )
+        print(
+            "%-30r scan: %8.2fms  index: %8.2fms"
+            % ((key_pattern, user_pattern), 1e3 * t_scan, 1e3 * t_index)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Measure per-keystroke latency of searches while typing, with and without a search session.
+
+Usage: python bench/bench_session.py [LIMIT]
+"""
+
+import os.path, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from pw.store import _parse_entries, SearchSession, Store
+from synthetic import generate
+
+SIZES = [10000, 100000, 1000000]
+TYPED = "mail.bank12"
+
+
+def keystrokes(limit, search):
+    # latencies of searching for each prefix of TYPED
+    latencies = []
+    for i in range(1, len(TYPED) + 1):
+        start = time.perf_counter()
+        search(TYPED[:i], "", limit)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for n in SIZES:
+        store = Store("", _parse_entries(generate(n)))
+        rescan = keystrokes(
+            limit, lambda key, user, limit: store.search(key, user)[:limit]
+        )
+        session = keystrokes(limit, SearchSession(store).search)
+        print(
+            "%8d entries  rescan: first %7.2fms, then mean %7.2fms  session: first %7.2fms, then mean %7.2fms"
+            % (
+                n,
+                1e3 * rescan[0],
+                1e3 * sum(rescan[1:]) / len(rescan[1:]),
+                1e3 * session[0],
+                1e3 * sum(session[1:]) / len(session[1:]),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
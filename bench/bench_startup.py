@@ -0,0 +1,59 @@
+"""Measure startup latency of `pw -R -S KEY`, via the fast path and via the full command line interface.
+
+Usage: python bench/bench_startup.py [REPEAT]
+"""
+
+import os.path, subprocess, sys, time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+STORE = os.path.join(ROOT, "test", "db.pw")
+ARGS = ["-R", "-S", "myphone"]
+
+VARIANTS = [
+    ("fast path", "from pw._fast import main; main()"),
+    ("click", "from pw.__main__ import pw; pw(prog_name='pw')"),
+    ("interpreter only", "pass"),
+]
+
+
+def run(code, extra_args=()):
+    env = dict(os.environ, PW_PATH=STORE, PYTHONPATH=ROOT)
+    return subprocess.run(
+        [sys.executable] + list(extra_args) + ["-c", code] + ARGS,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+
+
+def import_time(code):
+    # total (cumulative) microseconds spent in top-level imports
+    result = run(code, ["-X", "importtime"])
+    total = 0
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, name = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit() and not name.startswith("  "):
+                total += int(cumulative)
+    return total
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for name, code in VARIANTS:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(code)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print(
+            "%-18s median: %7.2fms  imports: %7.2fms"
+            % (name, 1e3 * times[len(times) // 2], 1e-3 * import_time(code))
+        )
+
+
+if __name__ == "__main__":
+    main()
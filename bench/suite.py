@@ -0,0 +1,151 @@
+"""Benchmark suite that times parsing, building, searching and loading synthetic stores, as well as the command line.
+
+Usage:
+  python bench/suite.py run [--sizes 1000,10000,100000] [--profiles ...] [--output FILE]
+  python bench/suite.py compare BASELINE RESULTS [--threshold 0.25]
+
+`run` writes the timings (the best of a few repetitions, in seconds) as JSON, which can be kept as
+a baseline. `compare` lists the timings of both files and exits with status 1 if any benchmark got
+slower by more than the threshold (a fraction of the baseline).
+"""
+
+import argparse, json, os.path, platform, shutil, subprocess, sys, tempfile, timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import pw
+from pw import _gpg
+from pw.store import _parse_entries, Store
+from synthetic import generate
+
+HOMEDIR = os.path.join(ROOT, "test", "keys")
+RECIPIENT = "test.user@localhost"
+QUERIES = [("mail.bank1", ""), ("vpn", "user7@"), ("", "user12@"), ("xyz", "")]
+
+# generator settings (given the number of entries), varying quoting, notes density and user reuse
+PROFILES = {
+    "default": lambda n: {},
+    "quoted": lambda n: {"quoting": 1.0},
+    "notes": lambda n: {"notes": 1.0, "notes_lines": 5},
+    "unique-users": lambda n: {"users": n},
+}
+
+
+def _best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def run_benchmarks(n, profile, repeat, dirname):
+    """Return timings of the benchmarks for a store with n entries."""
+    src = generate(n, **PROFILES[profile](n))
+    entries = _parse_entries(src)
+    store = Store("", entries)
+    timings = {
+        "parse": _best(lambda: _parse_entries(src), repeat),
+        "init": _best(lambda: Store("", entries), repeat),
+        "search": _best(lambda: [store.search(*q) for q in QUERIES], repeat),
+    }
+
+    # end-to-end, through gpg (with the keys of the test suite)
+    path = os.path.join(dirname, "store-%s-%d.pw.gpg" % (profile, n))
+    with open(path, "wb") as fp:
+        fp.write(_gpg.encrypt_bytes(RECIPIENT, src.encode("utf-8")))
+    timings["load-gpg"] = _best(lambda: Store.load(path), repeat)
+
+    # command line, in a fresh interpreter
+    key = entries[len(entries) // 2].key
+    env = dict(os.environ, PW_PATH=path, GNUPGHOME=HOMEDIR, PYTHONPATH=ROOT)
+    cmd = [sys.executable, "-c", "from pw._fast import main; main()", "-R", "-X", key]
+    timings["cli"] = _best(
+        lambda: subprocess.run(
+            cmd,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        ),
+        repeat,
+    )
+    return timings
+
+
+def run(args):
+    _gpg._OVERRIDE_HOMEDIR = HOMEDIR
+    results = {}
+    dirname = tempfile.mkdtemp()
+    try:
+        for profile in args.profiles.split(","):
+            for n in map(int, args.sizes.split(",")):
+                for name, seconds in run_benchmarks(
+                    n, profile, args.repeat, dirname
+                ).items():
+                    key = "%s/%s/%d" % (name, profile, n)
+                    results[key] = seconds
+                    print("%-32s %10.2fms" % (key, 1e3 * seconds), file=sys.stderr)
+    finally:
+        shutil.rmtree(dirname)
+
+    report = {
+        "pw": pw.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    content = json.dumps(report, indent=1, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as fp:
+            fp.write(content + "\n")
+    else:
+        print(content)
+
+
+def compare(args):
+    with open(args.baseline) as fp:
+        baseline = json.load(fp)["results"]
+    with open(args.results) as fp:
+        results = json.load(fp)["results"]
+
+    regressions = 0
+    for key in sorted(set(baseline) & set(results)):
+        ratio = results[key] / baseline[key] if baseline[key] else 1.0
+        regressed = ratio > 1 + args.threshold
+        regressions += regressed
+        print(
+            "%-32s %10.2fms %10.2fms %7.2fx%s"
+            % (
+                key,
+                1e3 * baseline[key],
+                1e3 * results[key],
+                ratio,
+                "  REGRESSION" if regressed else "",
+            )
+        )
+    for key in sorted(set(baseline) ^ set(results)):
+        print("%-32s only in %s" % (key, "baseline" if key in baseline else "results"))
+    if regressions:
+        print(
+            "%d regression(s) (threshold: %d%%)" % (regressions, 100 * args.threshold)
+        )
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("run", help="run benchmarks and write timings as JSON")
+    p.add_argument("--sizes", default="1000,10000,100000")
+    p.add_argument("--profiles", default=",".join(PROFILES))
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--output", "-o")
+    p.set_defaults(func=run)
+    p = commands.add_parser("compare", help="compare timings against a baseline")
+    p.add_argument("baseline")
+    p.add_argument("results")
+    p.add_argument("--threshold", type=float, default=0.25)
+    p.set_defaults(func=compare)
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
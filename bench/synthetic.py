@@ -0,0 +1,64 @@
+"""Deterministic generator for synthetic password stores."""
+
+import random
+
+_WORDS = [
+    "mail",
+    "bank",
+    "cloud",
+    "server",
+    "router",
+    "laptop",
+    "phone",
+    "wiki",
+    "vpn",
+    "backup",
+    "ci",
+    "db",
+]
+
+
+def _quoted(r, token, quoting):
+    # mix plain, double-quoted, single-quoted and escaped tokens (quoting is the fraction of
+    # tokens that are quoted or escaped)
+    x = r.random()
+    if x < quoting / 2:
+        return '"%s"' % token.replace("\\", "\\\\").replace('"', '\\"')
+    elif x < quoting * 3 / 4:
+        return "'%s'" % token
+    elif x < quoting:
+        return token.replace(" ", "\\ ")
+    return token
+
+
+def generate(n, seed=0, notes_lines=0, quoting=0.2, notes=0.1, users=None):
+    """Return source of a password store with n entries.
+
+    A fraction quoting of users and passwords is quoted or escaped, and a fraction notes of entries
+    is followed by a line of notes. If notes_lines is given, every entry is instead followed by that
+    many indented lines of notes (e.g., a pasted certificate or a list of recovery codes). The
+    entries share users (n // 100 distinct ones, unless given), like real stores do.
+    """
+    r = random.Random(seed)
+    if users is None:
+        users = n // 100
+    users = ["user%d@example.com" % i for i in range(max(1, users))]
+    lines = []
+    for i in range(n):
+        key = "%s.%s%d" % (r.choice(_WORDS), r.choice(_WORDS), i)
+        password = "".join(
+            r.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(16)
+        )
+        fields = [
+            key + ":",
+            _quoted(r, r.choice(users), quoting),
+            _quoted(r, password, quoting),
+        ]
+        if r.random() < 0.3:
+            fields.append("some notes for %s" % key)
+        lines.append(" ".join(fields))
+        if notes_lines:
+            lines.extend("  %s-%06d" % (password, j) for j in range(notes_lines))
+        elif r.random() < notes:
+            lines.append("  https://%s.example.com/" % key)
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,16 @@
-from .store import Store, Entry
+from typing import TYPE_CHECKING, Any
 
 __version__ = "0.14.1"
+
+if TYPE_CHECKING:
+    from .store import Entry, ReloadingStore, SearchSession, Store
+
+
+def __getattr__(name: str) -> Any:
+    # import the store on first use, so that modules not needing it (and the command line
+    # interface before it is needed) load quickly
+    if name in ("Entry", "ReloadingStore", "SearchSession", "Store"):
+        from . import store
+
+        return getattr(store, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -1,8 +1,17 @@
 #!/usr/bin/env python
 from functools import partial
-import os, os.path, random, signal, string, sys
+import json, os, os.path, random, re, shlex, signal, string, sys
 import click
-from . import __version__, Store, _gpg
+from . import __version__, Store, _daemon, _gpg, _journal, trace
+from ._fast import DEFAULT_FUZZY_LIMIT, load_store, search, split_query
+from .store import (
+    Entry,
+    _check_formattable,
+    _compile_pattern,
+    _format_entries,
+    _is_pwx,
+    _write_file,
+)
 
 
 class Mode(object):
@@ -15,12 +24,20 @@ def default_path():
     return os.environ.get("PW_PATH") or click.get_app_dir("passwords.pw.asc")
 
 
+def default_paths():
+    # PW_PATH may contain a list of paths (separated like PATH)
+    return [path for path in default_path().split(os.pathsep) if path]
+
+
 style_match = partial(click.style, fg="yellow", bold=True)
 style_error = style_password = partial(click.style, fg="red", bold=True)
 style_success = partial(click.style, fg="green", bold=True, reverse=True)
 
 
 def highlight_match(pattern, str):
+    """highlight matches of pattern (a substring or a compiled regular expression) in str"""
+    if isinstance(pattern, re.Pattern):
+        return pattern.sub(lambda m: style_match(m.group()) if m.group() else "", str)
     return style_match(pattern).join(str.split(pattern)) if pattern else str
 
 
@@ -60,6 +77,46 @@ RANDOM_PASSWORD_ALPHABET = string.ascii_letters + string.digits
     is_flag=True,
     help="Fail unless precisely a single result has been found.",
 )
+@click.option(
+    "--exact",
+    "-X",
+    "exact_flag",
+    is_flag=True,
+    help="Only match entries with precisely the given KEY (and USER, if given).",
+)
+@click.option(
+    "--fuzzy",
+    "-F",
+    "fuzzy_flag",
+    is_flag=True,
+    help="Match KEY and USER fuzzily and display the best matches first.",
+)
+@click.option(
+    "--limit",
+    metavar="N",
+    type=click.IntRange(min=1),
+    help="Display at most N results (%d by default with --fuzzy)."
+    % DEFAULT_FUZZY_LIMIT,
+)
+@click.option(
+    "--regex",
+    "regex_flag",
+    is_flag=True,
+    help="Match KEY and USER as regular expressions.",
+)
+@click.option(
+    "--glob",
+    "glob_flag",
+    is_flag=True,
+    help="Match KEY and USER as shell-style wildcard patterns (e.g., 'mail.*').",
+)
+@click.option(
+    "--prefix",
+    "-P",
+    "prefix_flag",
+    is_flag=True,
+    help="Only match keys starting with KEY (and only decrypt the shards of a sharded store that can contain them).",
+)
 @click.option(
     "--user",
     "-U",
@@ -70,9 +127,18 @@ RANDOM_PASSWORD_ALPHABET = string.ascii_letters + string.digits
 @click.option(
     "--file",
     "-f",
+    "files",
     metavar="PATH",
-    default=default_path(),
-    help="Path to password file.",
+    multiple=True,
+    default=default_paths,
+    help="Path to password file (or directory of a sharded password store). Can be repeated to search several password stores.",
+)
+@click.option(
+    "--cache",
+    "cache_flag",
+    is_flag=True,
+    envvar="PW_CACHE",
+    help="Keep a compiled (and, if necessary, encrypted) cache next to the password file to speed up loading.",
 )
 @click.option(
     "--edit",
@@ -83,6 +149,62 @@ RANDOM_PASSWORD_ALPHABET = string.ascii_letters + string.digits
 @click.option(
     "--gen", "gen_subcommand", is_flag=True, help="Generate a random password and exit."
 )
+@click.option(
+    "--set",
+    "set_subcommand",
+    is_flag=True,
+    help="Set password of USER@KEY (adding the entry if necessary) to a password read from stdin and exit.",
+)
+@click.option(
+    "--compact",
+    "compact_subcommand",
+    is_flag=True,
+    help="Fold changes made by --set into the password file and exit.",
+)
+@click.option(
+    "--reshard",
+    "reshard_dest",
+    metavar="DIR",
+    help="Split password database into a sharded password store in DIR and exit.",
+)
+@click.option(
+    "--convert",
+    "convert_dest",
+    metavar="PATH",
+    help="Convert password database to PATH and exit (to the per-entry encrypted format if PATH ends with .pwx).",
+)
+@click.option(
+    "--batch",
+    "batch_subcommand",
+    is_flag=True,
+    help="Read queries from stdin (one per line, optionally with --strict) and write one result per line.",
+)
+@click.option(
+    "--json",
+    "json_flag",
+    is_flag=True,
+    help="Write results of --batch as JSON lines.",
+)
+@click.option(
+    "--daemon",
+    "daemon_subcommand",
+    is_flag=True,
+    help="Keep password database loaded and serve searches until idle.",
+)
+@click.option(
+    "--daemon-ttl",
+    metavar="SECONDS",
+    type=float,
+    default=_daemon.DEFAULT_TTL,
+    show_default=True,
+    help="Idle timeout of --daemon.",
+)
+@click.option(
+    "--timings",
+    "timings_flag",
+    is_flag=True,
+    help="Report the time spent in each phase (e.g., decryption, parsing and searching) on stderr.",
+)
 @click.version_option(
     version=__version__, message="pw version %(version)s\npython " + sys.version
 )
@@ -93,10 +215,26 @@ def pw(
     user_pattern,
     mode,
     strict_flag,
+    exact_flag,
+    fuzzy_flag,
+    limit,
+    regex_flag,
+    glob_flag,
+    prefix_flag,
     user_flag,
-    file,
+    files,
+    cache_flag,
     edit_subcommand,
     gen_subcommand,
+    set_subcommand,
+    compact_subcommand,
+    reshard_dest,
+    convert_dest,
+    batch_subcommand,
+    json_flag,
+    daemon_subcommand,
+    daemon_ttl,
+    timings_flag,
 ):
     """Search for USER and KEY in GPG-encrypted password file."""
 
@@ -107,38 +245,112 @@ def pw(
 
     signal.signal(signal.SIGINT, handle_sigint)
 
+    # time phases if requested (reported when pw exits)
+    start_tracing(ctx, timings_flag)
+
     # invoke a subcommand?
     if gen_subcommand:
         length = int(key_pattern) if key_pattern else None
         generate_password(mode, length)
         return
-    elif edit_subcommand:
-        launch_editor(ctx, file)
-        return
 
-    # verify that database file is present
-    if not os.path.exists(file):
-        click.echo("error: password store not found at '%s'" % file, err=True)
+    # all but searches require a single database file
+    file = files[0]
+    if len(files) > 1 and (
+        edit_subcommand
+        or set_subcommand
+        or compact_subcommand
+        or daemon_subcommand
+        or reshard_dest
+        or convert_dest
+    ):
+        click.echo("error: multiple password stores given", err=True)
+        ctx.exit(1)
+
+    if exact_flag + fuzzy_flag + regex_flag + glob_flag > 1:
+        click.echo(
+            "error: only one of --exact, --fuzzy, --regex and --glob can be given",
+            err=True,
+        )
         ctx.exit(1)
 
-    # load database
-    store = Store.load(file)
+    if edit_subcommand:
+        launch_editor(ctx, file)
+        return
+
+    # verify that database files are present
+    for path in files:
+        if not os.path.exists(path):
+            click.echo("error: password store not found at '%s'" % path, err=True)
+            ctx.exit(1)
 
-    # if no user query provided, split key query according to right-most "@" sign (since usernames are typically email addresses)
-    if not user_pattern:
-        user_pattern, _, key_pattern = key_pattern.rpartition("@")
+    # change database, serve it, or answer a batch of queries?
+    if set_subcommand:
+        set_password(ctx, file, *split_query(key_pattern, user_pattern))
+        return
+    elif compact_subcommand:
+        compact(ctx, file)
+        return
+    elif daemon_subcommand:
+        run_daemon(ctx, file, daemon_ttl)
+        return
+    elif batch_subcommand:
+        run_batch(ctx, files, user_flag, json_flag, cache_flag, exact_flag)
+        return
+    elif reshard_dest:
+        reshard(ctx, file, reshard_dest)
+        return
+    elif convert_dest:
+        convert(ctx, file, convert_dest)
+        return
 
-    # search database
-    results = store.search(key_pattern, user_pattern)
-    results = list(results)
+    key_pattern, user_pattern = split_query(key_pattern, user_pattern)
+
+    # search database (using the daemon if one is running, otherwise load database)
+    try:
+        results = search(
+            files,
+            key_pattern,
+            user_pattern,
+            exact=exact_flag,
+            fuzzy=fuzzy_flag,
+            regex=regex_flag,
+            glob=glob_flag,
+            prefix=prefix_flag,
+            limit=limit,
+            cache=cache_flag,
+        )
+    except re.error as e:
+        click.echo("error: invalid pattern (%s)" % e, err=True)
+        ctx.exit(1)
 
     # if strict flag is enabled, check that precisely a single record was found
-    if strict_flag and len(results) != 1:
-        click.echo(
-            "error: multiple or no records found (but using --strict flag)", err=True
+    if strict_flag:
+        results = list(results)
+        if len(results) != 1:
+            click.echo(
+                "error: multiple or no records found (but using --strict flag)",
+                err=True,
+            )
+            ctx.exit(2)
+
+    with trace.span("render"):
+        display_results(
+            results,
+            files,
+            key_pattern,
+            user_pattern,
+            mode,
+            user_flag,
+            regex_flag,
+            glob_flag,
         )
-        ctx.exit(2)
 
+
+def display_results(
+    results, files, key_pattern, user_pattern, mode, user_flag, regex_flag, glob_flag
+):
+    """display search results (or copy the first password to the clipboard)"""
     # raw mode?
     if mode == Mode.RAW:
         for entry in results:
@@ -146,11 +358,16 @@ def pw(
         return
 
     # print results
+    if regex_flag or glob_flag:
+        key_pattern = _compile_pattern(key_pattern, glob_flag, key=True)
+        user_pattern = _compile_pattern(user_pattern, glob_flag)
     for idx, entry in enumerate(results):
         # start with key and user
         line = highlight_match(key_pattern, entry.key)
         if entry.user:
             line += ": " + highlight_match(user_pattern, entry.user)
+        if len(files) > 1:
+            line += " [%s]" % entry.source
 
         # add password or copy&paste sucess message
         if mode == Mode.ECHO and not user_flag:
@@ -159,7 +376,8 @@ def pw(
             try:
                 import pyperclip
 
-                pyperclip.copy(entry.user if user_flag else entry.password)
+                with trace.span("clipboard"):
+                    pyperclip.copy(entry.user if user_flag else entry.password)
                 result = style_success(
                     "*** %s COPIED TO CLIPBOARD ***"
                     % ("USERNAME" if user_flag else "PASSWORD")
@@ -194,6 +412,20 @@ def launch_editor(ctx, file):
         click.echo("error: password store not found at '%s'" % file, err=True)
         ctx.exit(1)
 
+    if os.path.isdir(file):
+        click.echo("error: sharded password stores cannot be edited", err=True)
+        ctx.exit(1)
+    if _is_pwx(file):
+        click.echo(
+            "error: password stores in the per-entry encrypted format cannot be edited (use --convert)",
+            err=True,
+        )
+        ctx.exit(1)
+
+    # changes made by --set are folded into the file first, so that they can be edited as well
+    if _journal.record_paths(file):
+        compact(ctx, file)
+
     # load source (decrypting if necessary)
     is_encrypted = _gpg.is_encrypted(file)
     if is_encrypted:
@@ -230,6 +462,202 @@ def launch_editor(ctx, file):
     _gpg.encrypt(recipient=recipient, dest_path=file, content=modified)
 
 
+def set_password(ctx, file, key, user):
+    """set password of an entry (adding it if necessary) by appending the change to the journal of the password database"""
+    if not key:
+        click.echo("error: no key given", err=True)
+        ctx.exit(1)
+    if os.path.isdir(file) or _is_pwx(file):
+        click.echo(
+            "error: passwords can only be set in password files in the text format",
+            err=True,
+        )
+        ctx.exit(1)
+
+    # passwords are prompted for on a terminal, and otherwise read from stdin
+    recipient = os.environ.get("PW_GPG_RECIPIENT")
+    if _gpg.is_encrypted(file) and not recipient:
+        click.echo("error: no recipient set in PW_GPG_RECIPIENT environment variables")
+        ctx.exit(1)
+    if sys.stdin.isatty():
+        password = click.prompt("Password", hide_input=True, confirmation_prompt=True)
+    else:
+        password = click.get_text_stream("stdin").readline().rstrip("\r\n")
+    if not password:
+        click.echo("error: no password given", err=True)
+        ctx.exit(1)
+    try:
+        _check_formattable(Entry(key, user, password, ""))
+    except ValueError as e:
+        click.echo("error: %s" % e, err=True)
+        ctx.exit(1)
+
+    record = {"op": "set", "key": key, "user": user, "password": password}
+    _journal.append(file, record, recipient)
+    if len(_journal.record_paths(file)) >= _journal.COMPACT_THRESHOLD:
+        compact(ctx, file)
+
+
+def compact(ctx, file):
+    """fold the journal of the password database into the database"""
+    recipient = os.environ.get("PW_GPG_RECIPIENT")
+    if _gpg.is_encrypted(file) and not recipient:
+        click.echo("error: no recipient set in PW_GPG_RECIPIENT environment variables")
+        ctx.exit(1)
+    count = _journal.compact(file, recipient)
+    click.echo("folded %d change(s) into '%s'" % (count, file), err=True)
+
+
+def reshard(ctx, file, dest):
+    """split password database into a sharded password store"""
+    from . import _shards
+
+    # shards are encrypted like the original database
+    ext = os.path.splitext(file)[1] if _gpg.is_encrypted(file) else ""
+    recipient = os.environ.get("PW_GPG_RECIPIENT")
+    if ext and not recipient:
+        click.echo("error: no recipient set in PW_GPG_RECIPIENT environment variables")
+        ctx.exit(1)
+
+    _shards.write(dest, _journal.iter_load(file), ext=ext, recipient=recipient)
+    click.echo("sharded '%s' into '%s'" % (file, dest), err=True)
+
+
+def convert(ctx, file, dest):
+    """convert password database between the text format and the per-entry encrypted format"""
+    from . import _pwx
+
+    recipient = os.environ.get("PW_GPG_RECIPIENT")
+    if (_is_pwx(dest) or _gpg.is_encrypted(dest)) and not recipient:
+        click.echo("error: no recipient set in PW_GPG_RECIPIENT environment variables")
+        ctx.exit(1)
+
+    entries = _journal.iter_load(file)
+    if _is_pwx(dest):
+        _pwx.write(dest, entries, recipient)
+    else:
+        _write_file(dest, _format_entries(entries).encode("utf-8"), recipient)
+    click.echo("converted '%s' into '%s'" % (file, dest), err=True)
+
+
+def run_daemon(ctx, file, ttl):
+    """load password database and serve searches until idle"""
+    if not _daemon.is_supported():
+        click.echo("error: --daemon requires Unix domain sockets", err=True)
+        ctx.exit(1)
+
+    store = Store.load(file, index=True)
+    try:
+        server = _daemon.Server(store, ttl=ttl)
+    except (OSError, RuntimeError) as e:
+        click.echo("error: %s" % e, err=True)
+        ctx.exit(1)
+    click.echo("serving '%s' (idle timeout: %gs)" % (file, ttl), err=True)
+    server.serve()
+
+
+BATCH_OK = 0
+BATCH_INVALID_QUERY = 1
+BATCH_NOT_STRICT = 2
+
+
+def parse_batch_query(line):
+    """parse query line of the form '[USER@][KEY] [USER]', optionally with -S/--strict flag"""
+    args = shlex.split(line)
+    strict = "-S" in args or "--strict" in args
+    args = [arg for arg in args if arg not in ("-S", "--strict")]
+    if len(args) > 2 or any(arg.startswith("-") for arg in args):
+        raise ValueError("expected [USER@][KEY] [USER] and optionally --strict")
+    key_pattern, user_pattern = split_query(*(args + ["", ""])[:2])
+    return key_pattern, user_pattern, strict
+
+
+def run_batch(ctx, files, user_flag, json_flag, cache, exact):
+    """load password database once and answer queries read from stdin, one per line"""
+    # parse all queries upfront, so that they can be searched for at once (empty lines are skipped)
+    lines = [
+        (lineno, line.strip())
+        for lineno, line in enumerate(
+            click.get_text_stream("stdin").read().splitlines()
+        )
+        if line.strip()
+    ]
+    queries = []
+    for _, line in lines:
+        try:
+            queries.append(parse_batch_query(line))
+        except ValueError as e:
+            queries.append(e)
+
+    store = load_store(files, cache=cache)
+    valid_queries = [q[:2] for q in queries if not isinstance(q, ValueError)]
+    if exact:
+        all_results = iter(
+            [store.get(key, user or None) for key, user in valid_queries]
+        )
+    else:
+        all_results = iter(store.search_many(valid_queries))
+
+    # write one result per query, reporting errors instead of exiting
+    exit_code = BATCH_OK
+    for (lineno, line), query in zip(lines, queries):
+        results = []
+        code, error = BATCH_OK, None
+        if isinstance(query, ValueError):
+            code, error = BATCH_INVALID_QUERY, "invalid query (%s)" % query
+        else:
+            results = next(all_results)
+            if query[2] and len(results) != 1:
+                code, error = BATCH_NOT_STRICT, "multiple or no records found"
+                results = []
+        exit_code = max(exit_code, code)
+
+        if json_flag:
+            result = {
+                "query": line,
+                "code": code,
+                "results": [
+                    (
+                        dict(entry._asdict(), **{"source": entry.source})
+                        if len(files) > 1
+                        else entry._asdict()
+                    )
+                    for entry in results
+                ],
+            }
+            if error:
+                result["error"] = error
+            click.echo(json.dumps(result))
+        else:
+            # as in copy mode, only the first result is used
+            if error:
+                click.echo("error: line %d: %s" % (lineno + 1, error), err=True)
+            if results:
+                click.echo(results[0].user if user_flag else results[0].password)
+            else:
+                click.echo()
+    ctx.exit(exit_code)
+
+
+def start_tracing(ctx, timings_flag):
+    """record spans and report them when pw exits (as a summary on stderr, and as a trace file to PW_TRACE if set)"""
+    trace_path = os.environ.get("PW_TRACE")
+    if not (timings_flag or trace_path):
+        return
+    recorder = trace.Recorder()
+    trace.add_hook(recorder)
+
+    def report():
+        trace.remove_hook(recorder)
+        if timings_flag:
+            recorder.write_summary(sys.stderr)
+        if trace_path:
+            with open(trace_path, "w") as fp:
+                recorder.write_json(fp)
+
+    ctx.call_on_close(report)
+
+
 def generate_password(mode, length):
     """generate a random password"""
     # generate random password
@@ -244,7 +672,8 @@ def generate_password(mode, length):
         try:
             import pyperclip
 
-            pyperclip.copy(password)
+            with trace.span("clipboard"):
+                pyperclip.copy(password)
             result = style_success("*** PASSWORD COPIED TO CLIPBOARD ***")
         except ImportError:
             result = style_error('*** PYTHON PACKAGE "PYPERCLIP" NOT FOUND ***')
@@ -0,0 +1,98 @@
+import hashlib, json, mmap, os, os.path, stat, struct, subprocess, sys
+from array import array
+from typing import List, Optional
+from . import _gpg
+from ._compact import BytesLike, CompactEntries
+from ._index import KeyString, UserTable
+from .store import Store, _iter_load, _write_file
+
+# file layout: header (magic, byte order, sizes of array items), digest of the source, sizes of
+# the sections, and the sections themselves (the columns of CompactEntries)
+_MAGIC = b"PWC1" + sys.byteorder[0].encode() + bytes([8, array("I").itemsize])
+_SECTIONS = struct.Struct("<6Q")
+
+
+def cache_path(path: str) -> str:
+    """Return path of the cache of given password store (which is encrypted if the store is)."""
+    return path + (".cache.gpg" if _gpg.is_encrypted(path) else ".cache")
+
+
+def source_digest(path: str) -> bytes:
+    """Return hash of the content of given password store (encrypted or not)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def dump(entries: CompactEntries, digest: bytes) -> bytes:
+    sections = [
+        entries.keys.string.encode("utf-8"),
+        entries.keys.offsets.tobytes(),
+        json.dumps(entries.users.distinct).encode("utf-8"),
+        entries.users.ids.tobytes(),
+        entries.value_offsets.tobytes(),
+        bytes(entries.values),
+    ]
+    header = _MAGIC + digest + _SECTIONS.pack(*map(len, sections))
+    return b"".join([header] + sections)
+
+
+def load(data: BytesLike, digest: bytes) -> Optional[CompactEntries]:
+    """Deserialize entries without copying their values (returns None if the cache is stale or invalid)."""
+    data = memoryview(data)
+    pos = len(_MAGIC) + len(digest)
+    if data[:pos] != _MAGIC + digest or len(data) < pos + _SECTIONS.size:
+        return None
+    sizes = _SECTIONS.unpack_from(data, pos)
+    pos += _SECTIONS.size
+    if len(data) != pos + sum(sizes):
+        return None
+
+    sections = []  # type: List[memoryview]
+    for size in sizes:
+        sections.append(data[pos : pos + size])
+        pos += size
+    key_offsets, user_ids, value_offsets = array("Q"), array("I"), array("Q")
+    key_offsets.frombytes(sections[1])
+    user_ids.frombytes(sections[3])
+    value_offsets.frombytes(sections[4])
+    keys = KeyString.from_string(str(sections[0], "utf-8"), key_offsets)
+    users = UserTable.from_ids(json.loads(str(sections[2], "utf-8")), user_ids)
+    return CompactEntries.from_columns(keys, users, sections[5], value_offsets)
+
+
+def _read(path: str) -> Optional[BytesLike]:
+    # decrypt encrypted caches into memory, but memory-map unencrypted ones
+    try:
+        if _gpg.is_encrypted(path):
+            return _gpg.decrypt(path)
+        with open(path, "rb") as fp:
+            return memoryview(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def load_entries(path: str, recipient: Optional[str] = None) -> CompactEntries:
+    """Load entries of password store from its cache if it is up to date, and otherwise parse the store and update the cache.
+
+    The cache of an encrypted store is only written if there is a recipient to encrypt it for.
+    """
+    digest = source_digest(path)
+    if os.path.exists(cache_path(path)):
+        data = _read(cache_path(path))
+        try:
+            cached = load(data, digest) if data is not None else None
+        except ValueError:
+            cached = None  # corrupt sections (rebuilt below)
+        if cached is not None:
+            return cached
+
+    # the cache is as private as the store (an unencrypted one contains every password)
+    entries = Store(path, _iter_load(path), compact=True).entries
+    assert isinstance(entries, CompactEntries)
+    if recipient or not _gpg.is_encrypted(path):
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+        _write_file(cache_path(path), dump(entries, digest), recipient, mode=mode)
+    return entries
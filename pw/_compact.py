@@ -0,0 +1,214 @@
+from array import array
+import mmap
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple, Union, overload
+from ._index import KeyString, UserTable
+from .store import Entry, SourcedEntry, _normalized_entry, _parse_entries, _with_source
+
+if TYPE_CHECKING:
+    from .store import Store
+
+BytesLike = Union[bytes, memoryview]
+
+
+class ColumnarEntries(Sequence[Entry]):
+    """Sequence of entries, sorted by (normalized) key, with columns of keys and users to search in."""
+
+    keys: KeyString
+    users: UserTable
+
+
+class CompactEntries(ColumnarEntries):
+    """Read-only sequence of entries stored in a few flat buffers rather than one tuple per entry.
+
+    Keys are concatenated into a single string, passwords and notes into a single UTF-8 buffer, and
+    users are interned. Entry tuples are only created on access.
+    """
+
+    def __init__(self, entries: Iterable[Entry]) -> None:
+        self.value_offsets = array("Q", [0])  # password and notes, alternatingly
+
+        keys = []  # type: List[str]
+        users = []  # type: List[str]
+        values = []  # type: List[bytes]
+        pos = 0
+        for entry in entries:
+            keys.append(entry.key)
+            users.append(entry.user)
+            for value in (entry.password, entry.notes):
+                encoded = value.encode("utf-8")
+                values.append(encoded)
+                pos += len(encoded)
+                self.value_offsets.append(pos)
+
+        self.keys = KeyString(keys)
+        self.users = UserTable(users)
+        self.values = b"".join(values)  # type: BytesLike
+
+    @classmethod
+    def from_columns(
+        cls,
+        keys: KeyString,
+        users: UserTable,
+        values: BytesLike,
+        value_offsets: "array[int]",
+    ) -> "CompactEntries":
+        """Construct from the columns of other compact entries (e.g., after deserializing).
+
+        The values can be any buffer, such as a memoryview of a memory-mapped file.
+        """
+        self = cls.__new__(cls)
+        self.keys = keys
+        self.users = users
+        self.values = values
+        self.value_offsets = value_offsets
+        return self
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    @overload
+    def __getitem__(self, idx: int) -> Entry: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> Sequence[Entry]: ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Entry, Sequence[Entry]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("entry index out of range")
+        offsets = self.value_offsets
+        values = self.values
+        return Entry(
+            self.keys[idx],
+            self.users[idx],
+            str(values[offsets[2 * idx] : offsets[2 * idx + 1]], "utf-8"),
+            str(values[offsets[2 * idx + 1] : offsets[2 * idx + 2]], "utf-8"),
+        )
+
+
+class SourcedEntries(ColumnarEntries):
+    """Read-only sequence merging the entries of several password stores, each annotated with the path of its store (see store.SourcedEntry).
+
+    Entries with equal keys remain in order of the stores. The entries of each store are only
+    accessed (e.g., decrypted or parsed in full) when they are accessed here.
+    """
+
+    def __init__(self, stores: Sequence["Store"]) -> None:
+        keys = []  # type: List[str]
+        users = []  # type: List[str]
+        for store in stores:
+            keys += store.keys
+            users += store.users
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+
+        # per entry, the index of its store and its index in the entries of that store
+        offsets = [0]
+        for store in stores:
+            offsets.append(offsets[-1] + len(store.entries))
+        store_ids = array("I")
+        for i, (start, end) in enumerate(zip(offsets, offsets[1:])):
+            store_ids.extend([i] * (end - start))
+
+        self.paths = [store.path for store in stores]
+        self.sources = [store.entries for store in stores]
+        self.keys = KeyString(keys[i] for i in order)
+        self.users = UserTable(users[i] for i in order)
+        self.store_ids = array("I", (store_ids[i] for i in order))
+        self.positions = array("Q", (i - offsets[store_ids[i]] for i in order))
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    @overload
+    def __getitem__(self, idx: int) -> SourcedEntry: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> Sequence[SourcedEntry]: ...
+
+    def __getitem__(
+        self, idx: Union[int, slice]
+    ) -> Union[SourcedEntry, Sequence[SourcedEntry]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("entry index out of range")
+        store_id = self.store_ids[idx]
+        entry = self.sources[store_id][self.positions[idx]]
+        return _with_source(entry, self.paths[store_id])
+
+
+class LazyEntries(ColumnarEntries):
+    """Read-only sequence of entries that are only parsed in full when accessed.
+
+    Constructed from the source of a password store and the records yielded by
+    store._iter_lazy_records, i.e., the normalized key and user of each entry as well as the span
+    of source that contains its entry line and notes.
+    """
+
+    def __init__(self, src: str, records: Iterable[Tuple[str, str, int, int]]) -> None:
+        # collect records in columns (interning users right away) and only then sort them, which
+        # needs much less memory than sorting the records themselves
+        keys = []  # type: List[str]
+        users = []  # type: List[str]
+        spans = array("Q")
+        distinct_users = {}  # type: Dict[str, str]
+        for key, user, start, end in records:
+            keys.append(key)
+            users.append(distinct_users.setdefault(user, user))
+            spans.append(start)
+            spans.append(end)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+
+        self.src = src
+        self.keys = KeyString(keys[i] for i in order)
+        self.users = UserTable(users[i] for i in order)
+        self.spans = array("Q")
+        for i in order:
+            self.spans.append(spans[2 * i])
+            self.spans.append(spans[2 * i + 1])
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    @overload
+    def __getitem__(self, idx: int) -> Entry: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> Sequence[Entry]: ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Entry, Sequence[Entry]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("entry index out of range")
+        (entry,) = _parse_entries(
+            self._segment(self.spans[2 * idx], self.spans[2 * idx + 1])
+        )
+        return _normalized_entry(entry)
+
+    def _segment(self, start: int, end: int) -> str:
+        return self.src[start:end]
+
+
+class MappedEntries(LazyEntries):
+    """Read-only sequence of the entries of a memory-mapped password store, which are only decoded and parsed in full when accessed.
+
+    Constructed from the memory-mapped source and the records yielded by store._iter_mapped_records,
+    whose spans are in bytes.
+    """
+
+    def __init__(
+        self, buf: mmap.mmap, records: Iterable[Tuple[str, str, int, int]]
+    ) -> None:
+        super(MappedEntries, self).__init__("", records)
+        self.buf = buf
+
+    def _segment(self, start: int, end: int) -> str:
+        return self.buf[start:end].decode("utf-8")
@@ -0,0 +1,165 @@
+import hashlib, json, os, os.path, socket, socketserver, stat, struct, tempfile
+from typing import Any, List, Optional, Tuple
+from .store import Entry, Store, _store_signature
+
+DEFAULT_TTL = 600  # seconds
+_CLIENT_TIMEOUT = 5  # seconds
+_MAX_REQUEST_SIZE = 64 * 1024
+
+
+def _socket_dir() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, "pw-%d" % os.getuid())
+
+
+def socket_path(store_path: str) -> str:
+    """Return path of the socket of the daemon serving given password store."""
+    store_path = os.path.abspath(store_path)
+    digest = hashlib.sha256(store_path.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(_socket_dir(), digest + ".sock")
+
+
+def _check_socket_dir(dirname: str) -> None:
+    # the directory must be private, since the socket serves plaintext passwords
+    st = os.lstat(dirname)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError("insecure daemon directory '%s'" % dirname)
+
+
+def _file_id(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_dev, st.st_ino
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and hasattr(os, "getuid")
+
+
+def search(
+    store_path: str, key_pattern: str, user_pattern: str
+) -> Optional[List[Entry]]:
+    """Search password store via its daemon (returns None if no daemon is serving the store)."""
+    if not is_supported():
+        return None
+    path = socket_path(store_path)
+    request = {
+        "path": os.path.abspath(store_path),
+        "key_pattern": key_pattern,
+        "user_pattern": user_pattern,
+    }
+    try:
+        _check_socket_dir(os.path.dirname(path))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(_CLIENT_TIMEOUT)
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as fp:
+                response = json.loads(fp.readline())
+    except (OSError, ValueError):
+        return None
+    if "entries" not in response:
+        return None
+    return [Entry(*e) for e in response["entries"]]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "Server"
+
+    # requests are handled one at a time, so a client that never sends its request must not block
+    # the daemon (and clients waiting for it) for longer than a client would wait
+    timeout = _CLIENT_TIMEOUT
+
+    def handle(self) -> None:
+        if not self.server.verify_peer(self.connection):
+            return
+        try:
+            request = json.loads(self.rfile.readline(_MAX_REQUEST_SIZE))
+            response = self.server.respond(request)  # type: Any
+        except (ValueError, KeyError, TypeError, socket.timeout) as e:
+            response = {"error": "invalid request (%s)" % e}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class Server(socketserver.UnixStreamServer):
+    """Serves searches in a loaded password store until it is idle for ttl seconds or the store file (or its journal) changes."""
+
+    def __init__(self, store: Store, ttl: float = DEFAULT_TTL) -> None:
+        self.store = store
+        self.store_path = os.path.abspath(store.path)
+        self.signature = _store_signature(self.store_path)
+        self.timeout = ttl
+        self.running = False
+
+        # create private socket directory
+        path = socket_path(self.store_path)
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, mode=0o700, exist_ok=True)
+        _check_socket_dir(dirname)
+
+        # refuse to replace the socket of a running daemon, but clean up after a dead one
+        if os.path.exists(path):
+            if search(self.store_path, "", "\0") is not None:
+                raise RuntimeError("a daemon is already serving '%s'" % store.path)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # the dead daemon just cleaned up itself
+
+        umask = os.umask(0o177)
+        try:
+            super(Server, self).__init__(path, _Handler)
+        finally:
+            os.umask(umask)
+
+        # a daemon started after this one stops (e.g. because the store changed) binds a new socket
+        # at the same path, which this one must not remove
+        self.socket_id = _file_id(path)
+
+    def verify_peer(self, connection: socket.socket) -> bool:
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True
+        creds = connection.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", creds)
+        return bool(uid == os.getuid())
+
+    def respond(self, request: Any) -> Any:
+        fields = ["path", "key_pattern", "user_pattern"]
+        if not isinstance(request, dict) or not all(
+            isinstance(request.get(field), str) for field in fields
+        ):
+            return {
+                "error": "invalid request (expected strings %s)" % ", ".join(fields)
+            }
+        if request["path"] != self.store_path:
+            return {"error": "serving a different store"}
+
+        # never serve stale results (the client falls back to loading the store directly)
+        try:
+            stale = _store_signature(self.store_path) != self.signature
+        except OSError:
+            stale = True
+        if stale:
+            self.running = False
+            return {"error": "store has changed"}
+
+        results = self.store.search(request["key_pattern"], request["user_pattern"])
+        return {"entries": [list(entry) for entry in results]}
+
+    def handle_timeout(self) -> None:
+        self.running = False
+
+    def serve(self) -> None:
+        """Serve requests until idle timeout or store file changes, and remove socket afterwards."""
+        self.running = True
+        try:
+            while self.running:
+                self.handle_request()
+        finally:
+            self.server_close()
+            try:
+                if _file_id(self.server_address) == self.socket_id:  # type: ignore
+                    os.unlink(self.server_address)  # type: ignore
+            except OSError:
+                pass
@@ -0,0 +1,154 @@
+import itertools, os, sys
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+from . import _daemon
+from .store import Entry, Store, _normalized_key
+
+# everything needed to answer searches, without click and the rest of the command line interface,
+# so that simple searches in raw mode (e.g., `pw -R -S KEY`) start quickly
+
+DEFAULT_FUZZY_LIMIT = 10
+
+_FLAGS = {
+    "-R": "raw",
+    "--raw": "raw",
+    "-S": "strict",
+    "--strict": "strict",
+    "-U": "user",
+    "--user": "user",
+    "-X": "exact",
+    "--exact": "exact",
+    "-P": "prefix",
+    "--prefix": "prefix",
+}
+
+
+def split_query(key_pattern: str, user_pattern: str) -> Tuple[str, str]:
+    """if no user query provided, split key query according to right-most "@" sign (since usernames are typically email addresses)"""
+    if not user_pattern:
+        user_pattern, _, key_pattern = key_pattern.rpartition("@")
+    return key_pattern, user_pattern
+
+
+def exact_matches(entries: Iterable[Entry], key: str, user: str) -> List[Entry]:
+    """filter entries with precisely the given key (and user, if given)"""
+    key = _normalized_key(key)
+    return [e for e in entries if e.key == key and (not user or e.user == user)]
+
+
+def load_store(
+    files: Sequence[str], key_prefix: str = "", cache: bool = False
+) -> Store:
+    """load password database (merging several databases if necessary)"""
+    if len(files) == 1:
+        recipient = os.environ.get("PW_GPG_RECIPIENT")
+        return Store.load(
+            files[0], key_prefix=key_prefix, cache=cache, recipient=recipient
+        )
+    return Store.load_many(files)
+
+
+def search(
+    files: Sequence[str],
+    key_pattern: str,
+    user_pattern: str,
+    exact: bool = False,
+    fuzzy: bool = False,
+    regex: bool = False,
+    glob: bool = False,
+    prefix: bool = False,
+    limit: Optional[int] = None,
+    cache: bool = False,
+) -> Iterable[Entry]:
+    """search password databases (using the daemon if one is serving the database, and otherwise loading them)"""
+    results = None  # type: Optional[Iterable[Entry]]
+    if len(files) == 1 and not (fuzzy or regex or glob):
+        results = _daemon.search(files[0], key_pattern, user_pattern)
+        if results is not None and exact:
+            results = exact_matches(results, key_pattern, user_pattern)
+    if results is None:
+        key_prefix = key_pattern if prefix or exact else ""
+        store = load_store(files, key_prefix=key_prefix, cache=cache)
+        if exact:
+            results = store.get(key_pattern, user_pattern or None)
+        elif fuzzy:
+            results = store.search_ranked(
+                key_pattern, user_pattern, limit=limit or DEFAULT_FUZZY_LIMIT
+            )
+        else:
+            results = store.iter_search(
+                key_pattern, user_pattern, regex=regex, glob=glob
+            )
+    if prefix:
+        normalized_prefix = _normalized_key(key_pattern)
+        results = (e for e in results if e.key.startswith(normalized_prefix))
+    if limit is not None:
+        results = itertools.islice(results, limit)
+    return results
+
+
+def _parse_args(args: List[str]) -> Optional[Tuple[Set[str], List[str], List[str]]]:
+    # parse flags, files and patterns of a search in raw mode (returns None for anything else)
+    flags = set()  # type: Set[str]
+    files = []  # type: List[str]
+    patterns = []  # type: List[str]
+    it = iter(args)
+    for arg in it:
+        if arg in ("-f", "--file"):
+            file = next(it, None)
+            if file is None:
+                return None
+            files.append(file)
+        elif arg.startswith("--file="):
+            files.append(arg[len("--file=") :])
+        elif arg in _FLAGS:
+            flags.add(_FLAGS[arg])
+        elif arg.startswith("-") and arg != "-":
+            # combined short flags (e.g., -RS)
+            if arg.startswith("--") or any("-" + c not in _FLAGS for c in arg[1:]):
+                return None
+            flags.update(_FLAGS["-" + c] for c in arg[1:])
+        else:
+            patterns.append(arg)
+    if "raw" not in flags or len(patterns) > 2:
+        return None
+    return flags, files, patterns
+
+
+def main() -> None:
+    """Entry point of the pw command, which answers searches in raw mode directly and leaves everything else to the full command line interface."""
+    parsed = _parse_args(sys.argv[1:])
+
+    # the full interface takes care of defaults that need click, of reporting errors, and of tracing
+    files = []  # type: List[str]
+    if parsed is not None and not {"PW_CACHE", "PW_TRACE"} & set(os.environ):
+        files = parsed[1] or [
+            p for p in os.environ.get("PW_PATH", "").split(os.pathsep) if p
+        ]
+    if parsed is None or not files or not all(map(os.path.exists, files)):
+        from .__main__ import pw
+
+        pw(prog_name="pw")
+        return
+
+    flags, _, patterns = parsed
+    key_pattern, user_pattern = split_query(*(patterns + ["", ""])[:2])
+    try:
+        results = search(
+            files,
+            key_pattern,
+            user_pattern,
+            exact="exact" in flags,
+            prefix="prefix" in flags,
+        )
+        if "strict" in flags:
+            results = list(results)
+            if len(results) != 1:
+                sys.stderr.write(
+                    "error: multiple or no records found (but using --strict flag)\n"
+                )
+                sys.exit(2)
+        for entry in results:
+            sys.stdout.write((entry.user if "user" in flags else entry.password) + "\n")
+    except KeyboardInterrupt:
+        sys.stdout.write("\n")
+        sys.exit(1)
@@ -1,6 +1,8 @@
+from contextlib import contextmanager
 import os.path
 import subprocess
-from typing import List, Optional, cast
+from typing import IO, Iterator, List, Optional, cast
+from . import trace
 
 _HAS_ARMOR = {".gpg": False, ".asc": True}
 _EXTENSIONS = _HAS_ARMOR.keys()
@@ -36,7 +38,27 @@ def _base_args() -> List[str]:
 
 def decrypt(path: str) -> bytes:
     args = ["--decrypt", path]
-    return cast(bytes, subprocess.check_output(_base_args() + args))
+    with trace.span("gpg.decrypt", path=path):
+        return cast(bytes, subprocess.check_output(_base_args() + args))
+
+
+@contextmanager
+def decrypt_stream(path: str) -> Iterator[IO[bytes]]:
+    """Decrypt file, yielding gpg's stdout while decryption is still in progress.
+
+    The span of the decryption includes the time spent consuming the output (e.g., parsing it).
+    """
+    args = _base_args() + ["--decrypt", path]
+    with trace.span("gpg.decrypt", path=path, streamed=True):
+        popen = subprocess.Popen(args, stdout=subprocess.PIPE)
+        stdout = cast(IO[bytes], popen.stdout)
+        try:
+            yield stdout
+        finally:
+            stdout.close()
+            returncode = popen.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, args)
 
 
 def encrypt(recipient: str, dest_path: str, content: bytes) -> None:
@@ -44,11 +66,36 @@ def encrypt(recipient: str, dest_path: str, content: bytes) -> None:
     if has_armor(dest_path):
         args += ["--armor"]
     args += ["--recipient", recipient, "--output", dest_path]
-    popen = subprocess.Popen(
-        _base_args() + args,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    stdout, stderr = popen.communicate(content)
+    with trace.span("gpg.encrypt", path=dest_path):
+        popen = subprocess.Popen(
+            _base_args() + args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        stdout, stderr = popen.communicate(content)
+    assert popen.returncode == 0, stderr
+
+
+def decrypt_bytes(content: bytes) -> bytes:
+    """Decrypt content (rather than a file) via gpg's stdin."""
+    args = ["--decrypt"]
+    with trace.span("gpg.decrypt", size=len(content)):
+        return subprocess.run(
+            _base_args() + args, input=content, stdout=subprocess.PIPE, check=True
+        ).stdout
+
+
+def encrypt_bytes(recipient: str, content: bytes) -> bytes:
+    """Encrypt content for recipient, returning the (binary) encrypted message rather than writing it to a file."""
+    args = ["--encrypt", "--recipient", recipient]
+    with trace.span("gpg.encrypt", size=len(content)):
+        popen = subprocess.Popen(
+            _base_args() + args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        stdout, stderr = popen.communicate(content)
     assert popen.returncode == 0, stderr
+    return stdout
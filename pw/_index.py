@@ -0,0 +1,165 @@
+import re
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+class KeyString(Sequence[str]):
+    """Keys concatenated into a single newline-separated string, so that a substring search runs at the speed of str.find."""
+
+    def __init__(self, keys: Iterable[str]) -> None:
+        self.offsets = array("Q", [0])
+        parts = []
+        pos = 0
+        for key in keys:
+            if "\n" in key:
+                raise ValueError("key must not contain newlines (%r)" % key)
+            parts.append(key)
+            pos += len(key) + 1
+            self.offsets.append(pos)
+        parts.append("")
+        self.string = "\n".join(parts)
+
+    @classmethod
+    def from_string(cls, string: str, offsets: "array[int]") -> "KeyString":
+        """Construct from the string and offsets of another KeyString (e.g., after deserializing)."""
+        self = cls.__new__(cls)
+        self.string = string
+        self.offsets = offsets
+        return self
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):  # type: ignore
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("key index out of range")
+        return self.string[self.offsets[idx] : self.offsets[idx + 1] - 1]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.string.split("\n")[:-1])
+
+    def find(self, pattern: str, start: int = 0) -> Iterator[int]:
+        """Return increasing indices (from start on) of the keys containing pattern."""
+        if "\n" in pattern or start >= len(self):
+            return
+        string = self.string
+        offsets = self.offsets
+        if not pattern:
+            yield from range(start, len(self))
+            return
+
+        # skip to the next key after each match
+        pos = string.find(pattern, offsets[start])
+        while pos >= 0:
+            idx = bisect_right(offsets, pos) - 1
+            yield idx
+            pos = string.find(pattern, offsets[idx + 1])
+
+    def find_subsequence(self, pattern: str) -> Iterator[int]:
+        """Return increasing indices of the keys containing the characters of pattern in order (but not necessarily adjacent)."""
+        if "\n" in pattern:
+            return
+        if not pattern:
+            yield from range(len(self))
+            return
+
+        # a match cannot span several keys, since the gaps exclude newlines, and each gap only
+        # extends to the next occurrence of the next character, which avoids backtracking
+        regex = re.compile(
+            re.escape(pattern[0])
+            + "".join("[^\n%s]*%s" % (re.escape(c), re.escape(c)) for c in pattern[1:])
+        )
+        string = self.string
+        offsets = self.offsets
+        match = regex.search(string)
+        while match:
+            idx = bisect_right(offsets, match.start()) - 1
+            yield idx
+            match = regex.search(string, offsets[idx + 1])
+
+
+class UserTable(Sequence[str]):
+    """Users of all entries, interned, since the same user typically appears in many entries."""
+
+    def __init__(self, users: Iterable[str]) -> None:
+        ids = {}  # type: Dict[str, int]
+        self.distinct = []  # type: List[str]
+        self.ids = array("I")
+        for user in users:
+            user_id = ids.setdefault(user, len(self.distinct))
+            if user_id == len(self.distinct):
+                self.distinct.append(user)
+            self.ids.append(user_id)
+
+    @classmethod
+    def from_ids(cls, distinct: List[str], ids: "array[int]") -> "UserTable":
+        """Construct from the distinct users and ids of another UserTable (e.g., after deserializing)."""
+        self = cls.__new__(cls)
+        self.distinct = distinct
+        self.ids = ids
+        return self
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, idx):  # type: ignore
+        if isinstance(idx, slice):
+            return [self.distinct[i] for i in self.ids[idx]]
+        return self.distinct[self.ids[idx]]
+
+    def __iter__(self) -> Iterator[str]:
+        distinct = self.distinct
+        return (distinct[user_id] for user_id in self.ids)
+
+    def matches(self, pattern: str) -> List[bool]:
+        """Return for each distinct user whether it contains pattern."""
+        return [pattern in user for user in self.distinct]
+
+
+class NgramIndex:
+    """Index of the n-grams occurring in the keys and users of a password store.
+
+    The index only narrows down the candidates for a search: entries returned by candidates() may
+    still fail the substring check, but entries not returned cannot match.
+    """
+
+    def __init__(self, keys: Iterable[str], users: Iterable[str], n: int = 3) -> None:
+        self.n = n
+        self.keys = self._build(keys)
+        self.users = self._build(users)
+
+    def _build(self, strings: Iterable[str]) -> Dict[str, "array[int]"]:
+        n = self.n
+        postings = {}  # type: Dict[str, array[int]]
+        for idx, s in enumerate(strings):
+            for gram in {s[i : i + n] for i in range(len(s) - n + 1)}:
+                try:
+                    postings[gram].append(idx)
+                except KeyError:
+                    postings[gram] = array("I", [idx])
+        return postings
+
+    def _postings(
+        self, postings: Dict[str, "array[int]"], pattern: str
+    ) -> List[Sequence[int]]:
+        n = self.n
+        grams = {pattern[i : i + n] for i in range(len(pattern) - n + 1)}
+        return [postings.get(gram, ()) for gram in grams]
+
+    def candidates(
+        self, key_pattern: str, user_pattern: str
+    ) -> Optional[Sequence[int]]:
+        """Return increasing indices of candidate entries (or None if all entries are candidates)."""
+        postings = self._postings(self.keys, key_pattern) + self._postings(
+            self.users, user_pattern
+        )
+        if not postings:
+            return None
+
+        # the shortest posting list is already a good filter; the substring check does the rest
+        return min(postings, key=len)
@@ -0,0 +1,236 @@
+import json, os, os.path, tempfile
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from . import _gpg
+from .store import (
+    Entry,
+    Store,
+    _format_entries,
+    _is_pwx,
+    _iter_lazy_records,
+    _iter_load,
+    _load_source,
+    _normalized_key,
+    _parse_entries,
+    _write_file,
+)
+
+# changes to a password file are appended to a journal directory next to it, one small record
+# (encrypted like the file) per change, and replayed whenever the file is loaded; compaction folds
+# them back into the file
+
+COMPACT_THRESHOLD = 64  # records
+
+# net changes by (normalized) key and user: None if removed, and otherwise the new values of the
+# changed fields, which include the key (as given) if the entry is to be added if missing
+Changes = Dict[Tuple[str, str], Optional[Dict[str, str]]]
+
+
+def journal_path(path: str) -> str:
+    """Return path of the journal directory of given password file."""
+    return path + ".journal"
+
+
+def record_paths(path: str) -> List[str]:
+    """Return paths of the journal records of given password file, in order."""
+    try:
+        filenames = os.listdir(journal_path(path))
+    except FileNotFoundError:
+        return []
+    numbered = [(name.split(".", 1)[0], name) for name in filenames]
+    return [
+        os.path.join(journal_path(path), name)
+        for number, name in sorted(
+            (int(n), name) for n, name in numbered if n.isdigit()
+        )
+    ]
+
+
+def append(path: str, record: Dict[str, str], recipient: Optional[str] = None) -> None:
+    """Append record to the journal of given password file (encrypted for recipient if the file is encrypted).
+
+    Records are dictionaries with an "op" ("add", "set", "update" or "remove"), the "key" and "user"
+    of an entry, and, depending on the operation, its new "password" and "notes".
+    """
+    if not os.path.isfile(path) or _is_pwx(path):
+        raise ValueError(
+            "changes can only be journaled for password files ('%s')" % path
+        )
+
+    # records of unencrypted files contain plaintext passwords
+    dirname = journal_path(path)
+    os.makedirs(dirname, mode=0o700, exist_ok=True)
+    ext = os.path.splitext(path)[1] if _gpg.is_encrypted(path) else ""
+
+    # write the record under a temporary name first, and then link it to the next free number (so
+    # that concurrent writers never replace each other's records)
+    fd, tmp_path = tempfile.mkstemp(prefix="tmp-", suffix=".json" + ext, dir=dirname)
+    os.close(fd)
+    try:
+        _write_file(tmp_path, json.dumps(record).encode("utf-8"), recipient, mode=0o600)
+        paths = record_paths(path)
+        number = int(os.path.basename(paths[-1]).split(".", 1)[0]) + 1 if paths else 1
+        while True:
+            try:
+                os.link(tmp_path, os.path.join(dirname, "%08d.json%s" % (number, ext)))
+                break
+            except FileExistsError:
+                number += 1
+    finally:
+        os.remove(tmp_path)
+
+
+def _read_record(path: str) -> Dict[str, str]:
+    if _gpg.is_encrypted(path):
+        content = _gpg.decrypt(path)
+    else:
+        with open(path, "rb") as fp:
+            content = fp.read()
+    record = json.loads(content.decode("utf-8"))  # type: Dict[str, str]
+    return record
+
+
+def read(path: str) -> List[Dict[str, str]]:
+    """Return the journal records of given password file, in order."""
+    return _read_records(record_paths(path))
+
+
+def _read_records(paths: List[str]) -> List[Dict[str, str]]:
+    if len(paths) <= 1 or not _gpg.is_encrypted(paths[0]):
+        return [_read_record(p) for p in paths]
+
+    # gpg runs in a separate process, so decryptions proceed concurrently
+    from concurrent.futures import ThreadPoolExecutor  # slow to import
+
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        return list(executor.map(_read_record, paths))
+
+
+def fold(
+    records: Iterable[Dict[str, str]], changes: Optional[Changes] = None
+) -> Changes:
+    """Fold records into the net changes they make (updating changes, if given)."""
+    changes = {} if changes is None else changes
+    for record in records:
+        op = record["op"]
+        entry_id = (_normalized_key(record["key"]), record["user"])
+        fields = {f: record[f] for f in ["password", "notes"] if f in record}
+        current = changes.get(entry_id, {})
+        if op == "add":
+            changes[entry_id] = dict(fields, key=record["key"])
+        elif op == "set":
+            changes[entry_id] = dict(current or {}, key=record["key"], **fields)
+        elif op == "update":
+            if current is not None:
+                changes[entry_id] = dict(current, **fields)
+        elif op == "remove":
+            changes[entry_id] = None
+        else:
+            raise ValueError("invalid journal record (%r)" % op)
+    return changes
+
+
+def _changed(entry: Entry, fields: Dict[str, str]) -> Entry:
+    return entry._replace(
+        password=fields.get("password", entry.password),
+        notes=fields.get("notes", entry.notes),
+    )
+
+
+def _added(changes: Changes, seen: Set[Tuple[str, str]]) -> List[Entry]:
+    return [
+        Entry(fields["key"], user, fields["password"], fields.get("notes", ""))
+        for (key, user), fields in changes.items()
+        if fields is not None and "key" in fields and (key, user) not in seen
+    ]
+
+
+def apply(entries: Iterable[Entry], changes: Changes) -> Iterator[Entry]:
+    """Apply changes to entries, yielding entries that were added last.
+
+    Applying the same changes more than once has no further effect.
+    """
+    seen = set()  # type: Set[Tuple[str, str]]
+    for entry in entries:
+        entry_id = (_normalized_key(entry.key), entry.user)
+        if entry_id in changes:
+            fields = changes[entry_id]
+            if fields is None:
+                continue
+            seen.add(entry_id)
+            entry = _changed(entry, fields)
+        yield entry
+    yield from _added(changes, seen)
+
+
+def iter_load(path: str) -> Iterator[Entry]:
+    """Load entries of password file while parsing it (like store._iter_load), with its journal replayed."""
+    changes = fold(read(path))
+    if not changes:
+        return _iter_load(path)
+    return apply(_iter_load(path), changes)
+
+
+def replay(store: Store) -> Store:
+    """Return store with the journal of its password file replayed (or store itself if there is none)."""
+    return replay_changes(store, fold(read(store.path)))
+
+
+def replay_changes(store: Store, changes: Changes) -> Store:
+    """Return store with changes applied (or store itself if there are none)."""
+    if not changes:
+        return store
+    from ._compact import CompactEntries
+
+    return Store(
+        store.path,
+        apply(store.entries, changes),
+        index=store.index is not None,
+        compact=isinstance(store.entries, CompactEntries),
+    )
+
+
+def _apply_to_source(src: str, changes: Changes) -> str:
+    # entries without changes (as well as comments and empty lines) are kept verbatim
+    pieces = []  # type: List[str]
+    pos = 0
+    seen = set()  # type: Set[Tuple[str, str]]
+    for key, user, start, end in _iter_lazy_records(src):
+        if (key, user) not in changes:
+            continue
+        fields = changes[key, user]
+        pieces.append(src[pos:start])
+        if fields is None:
+            # drop removed entries together with their line break
+            end += 2 if src.startswith("\r\n", end) else 1
+        else:
+            seen.add((key, user))
+            entry = _changed(_parse_entries(src[start:end])[0], fields)
+            pieces.append(_format_entries([entry]).rstrip("\n"))
+        pos = end
+    pieces.append(src[pos:])
+    src = "".join(pieces)
+
+    added = _added(changes, seen)
+    if added and src and not src.endswith("\n"):
+        src += "\n"
+    return src + _format_entries(added)
+
+
+def compact(path: str, recipient: Optional[str] = None) -> int:
+    """Fold the journal of given password file into the file (encrypted for recipient if it is encrypted), and return the number of records folded.
+
+    Records appended while compacting are kept, and folding them again after an interrupted compaction has no further effect.
+    """
+    paths = record_paths(path)
+    if not paths:
+        return 0
+    changes = fold(_read_records(paths))
+    src = _apply_to_source(_load_source(path), changes)
+    _write_file(path, src.encode("utf-8"), recipient)
+    for p in paths:
+        os.remove(p)
+    try:
+        os.rmdir(journal_path(path))
+    except OSError:
+        pass
+    return len(paths)
@@ -0,0 +1,85 @@
+import json, struct
+from array import array
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Sequence, Union, overload
+from . import _gpg
+from ._compact import ColumnarEntries
+from ._index import KeyString, UserTable
+from .store import Entry, _normalized_key, _write_file
+
+# file layout: magic, size of the encrypted index, encrypted index, encrypted passwords
+_MAGIC = b"PWX1\n"
+_SIZE = struct.Struct(">Q")
+
+
+def write(path: str, entries: Iterable[Entry], recipient: str) -> None:
+    """Write entries in the per-entry encrypted format, in which each password is encrypted separately.
+
+    The index contains keys, users and notes, as well as the offset and size of each encrypted password.
+    """
+    blobs = []
+    records = []
+    pos = 0
+    for entry in sorted(entries, key=lambda e: _normalized_key(e.key)):
+        blob = _gpg.encrypt_bytes(recipient, entry.password.encode("utf-8"))
+        records.append([entry.key, entry.user, entry.notes, pos, len(blob)])
+        blobs.append(blob)
+        pos += len(blob)
+    index = json.dumps({"entries": records}).encode("utf-8")
+    index_blob = _gpg.encrypt_bytes(recipient, index)
+    content = _MAGIC + _SIZE.pack(len(index_blob)) + index_blob + b"".join(blobs)
+    _write_file(path, content, recipient)
+
+
+class PwxEntries(ColumnarEntries):
+    """Read-only sequence of the entries of a password store in the per-entry encrypted format.
+
+    Only the index is decrypted upfront, while each password is decrypted when its entry is accessed.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as fp:
+            data = fp.read()
+        if not data.startswith(_MAGIC):
+            raise ValueError("'%s' is not in the per-entry encrypted format" % path)
+        (size,) = _SIZE.unpack_from(data, len(_MAGIC))
+        start = len(_MAGIC) + _SIZE.size
+        index = json.loads(_gpg.decrypt_bytes(data[start : start + size]))
+        self.blobs = memoryview(data)[start + size :]
+
+        # the keys are searched in normalized form, but also kept as given (see iter_original)
+        records = [[_normalized_key(r[0])] + r for r in index["entries"]]
+        records.sort(key=itemgetter(0))
+        self.keys = KeyString(r[0] for r in records)
+        self.original_keys = [r[1] for r in records]  # type: List[str]
+        self.users = UserTable(r[2] for r in records)
+        self.notes = [r[3] for r in records]  # type: List[str]
+        self.spans = array("Q")
+        for r in records:
+            self.spans.append(r[4])
+            self.spans.append(r[4] + r[5])
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    @overload
+    def __getitem__(self, idx: int) -> Entry: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> Sequence[Entry]: ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Entry, Sequence[Entry]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("entry index out of range")
+        blob = self.blobs[self.spans[2 * idx] : self.spans[2 * idx + 1]]
+        password = _gpg.decrypt_bytes(bytes(blob)).decode("utf-8")
+        return Entry(self.keys[idx], self.users[idx], password, self.notes[idx])
+
+    def iter_original(self) -> Iterator[Entry]:
+        """Yield all entries with their keys as given when the store was written (rather than normalized)."""
+        for idx, entry in enumerate(self):
+            yield entry._replace(key=self.original_keys[idx])
@@ -0,0 +1,122 @@
+import glob, json, os, os.path, re
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .store import (
+    Entry,
+    _format_entries,
+    _load_source,
+    _normalized_key,
+    _write_file,
+)
+
+MANIFEST_NAME = "manifest.pw"
+DEFAULT_SHARD_SIZE = 1000  # entries
+
+# shards are named by the generation of the store they belong to, so that writing a new version
+# never replaces the shards of the version that the current manifest refers to
+_SHARD_NAME_RE = re.compile(r"shard-(?:(\d+)-)?\d+\.pw")
+
+
+def manifest_path(dirname: str) -> str:
+    """Return path of the manifest of a sharded store (unencrypted or encrypted)."""
+    for ext in ["", ".gpg", ".asc"]:
+        path = os.path.join(dirname, MANIFEST_NAME + ext)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError("no manifest found in '%s'" % dirname)
+
+
+def load_manifest(dirname: str) -> List[Tuple[str, str]]:
+    """Return list of key prefixes and the names of the shard files containing their keys."""
+    manifest = json.loads(_load_source(manifest_path(dirname)))
+    shards = [(shard["prefix"], shard["file"]) for shard in manifest["shards"]]
+    for _, filename in shards:
+        if os.path.basename(filename) != filename:
+            raise ValueError("invalid shard file name in manifest (%r)" % filename)
+    return shards
+
+
+def shard_paths(dirname: str, key_prefix: str = "") -> List[str]:
+    """Return paths of the shards that can contain keys starting with given (normalized) prefix."""
+    # every key is stored in the shard of a prefix of the key, so a prefix of a key starting with
+    # key_prefix is either itself a prefix of key_prefix, or starts with key_prefix
+    filenames = []  # type: List[str]
+    for prefix, filename in load_manifest(dirname):
+        if prefix.startswith(key_prefix) or key_prefix.startswith(prefix):
+            if filename not in filenames:
+                filenames.append(filename)
+    return [os.path.join(dirname, filename) for filename in filenames]
+
+
+def _split(
+    keys: List[str], prefix: str, start: int, end: int, shard_size: int
+) -> Iterator[Tuple[str, int, int]]:
+    # split the (sorted) keys in [start, end), which all start with prefix, by their next character
+    # until there are at most shard_size keys per prefix
+    if end - start <= shard_size:
+        yield prefix, start, end
+        return
+
+    # keys equal to the prefix are sorted first and stay with the prefix itself
+    n = len(prefix)
+    pos = start
+    while pos < end and len(keys[pos]) == n:
+        pos += 1
+    if pos > start:
+        yield prefix, start, pos
+
+    while pos < end:
+        child = keys[pos][: n + 1]
+        child_end = pos + 1
+        while child_end < end and keys[child_end].startswith(child):
+            child_end += 1
+        yield from _split(keys, child, pos, child_end, shard_size)
+        pos = child_end
+
+
+def write(
+    dirname: str,
+    entries: Iterable[Entry],
+    ext: str = "",
+    recipient: Optional[str] = None,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+) -> None:
+    """Write entries as a sharded store into given directory, encrypting for recipient if ext is '.gpg' or '.asc'."""
+    # sort entries by normalized key (but store them as they are)
+    keyed = sorted(((_normalized_key(e.key), e) for e in entries), key=itemgetter(0))
+    keys = [key for key, _ in keyed]
+
+    # pack consecutive prefixes into shards of at most shard_size entries (unless a single prefix has more)
+    shards = []  # type: List[Tuple[List[str], int, int]]
+    for prefix, start, end in _split(keys, "", 0, len(keys), shard_size):
+        if shards and end - shards[-1][1] <= shard_size:
+            shards[-1][0].append(prefix)
+            shards[-1] = (shards[-1][0], shards[-1][1], end)
+        else:
+            shards.append(([prefix], start, end))
+
+    # write shards under new names before the manifest, which then atomically replaces any previous
+    # version of the store (whose shards are only removed afterwards)
+    os.makedirs(dirname, exist_ok=True)
+    previous = [
+        os.path.basename(path)
+        for path in glob.glob(os.path.join(dirname, MANIFEST_NAME + "*"))
+        + glob.glob(os.path.join(dirname, "shard-*.pw*"))
+    ]
+    generation = 1 + max(
+        [int(m.group(1) or 0) for m in map(_SHARD_NAME_RE.match, previous) if m],
+        default=0,
+    )
+    manifest = []
+    for idx, (prefixes, start, end) in enumerate(shards):
+        filename = "shard-%d-%04d.pw%s" % (generation, idx, ext)
+        src = _format_entries(entry for _, entry in keyed[start:end])
+        _write_file(os.path.join(dirname, filename), src.encode("utf-8"), recipient)
+        manifest += [{"prefix": prefix, "file": filename} for prefix in prefixes]
+    content = json.dumps({"shards": manifest}, indent=1).encode("utf-8")
+    _write_file(os.path.join(dirname, MANIFEST_NAME + ext), content, recipient)
+
+    # remove manifests and shards of previous versions of the store
+    for filename in previous:
+        if filename != MANIFEST_NAME + ext:
+            os.unlink(os.path.join(dirname, filename))
@@ -1,8 +1,21 @@
+from bisect import bisect_left
 from collections import namedtuple
-from io import StringIO
-from shlex import shlex
-from typing import List, Iterable
-from . import _gpg
+from itertools import islice
+from operator import attrgetter, itemgetter, ne
+import copy, fnmatch, heapq, io, mmap, os, re, shlex, stat, tempfile, threading
+from typing import (
+    IO,
+    Any,
+    Dict,
+    List,
+    Iterable,
+    Iterator,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+)
+from . import _gpg, _index, trace
 
 Entry = namedtuple("Entry", ["key", "user", "password", "notes"])
 
@@ -11,47 +24,840 @@ def _normalized_key(key: str) -> str:
     return key.replace(" ", "_").lower()
 
 
+def _normalized_entry(entry: Entry) -> Entry:
+    key = _normalized_key(entry.key)
+    return entry if key == entry.key else entry._replace(key=key)
+
+
+class SourcedEntry(Entry):
+    """Entry annotated with the path of the password store it was loaded from (compares equal to the plain entry)."""
+
+    source: str
+
+
+def _with_source(entry: Entry, source: str) -> SourcedEntry:
+    sourced = SourcedEntry._make(entry)
+    sourced.source = source
+    return sourced
+
+
 class Store:
     """Password store."""
 
-    def __init__(self, path: str, entries: Iterable[Entry]) -> None:
-        # normalize keys
-        self.entries = [e._replace(key=_normalized_key(e.key)) for e in entries]
+    def __init__(
+        self,
+        path: str,
+        entries: Iterable[Entry],
+        index: bool = False,
+        compact: bool = False,
+    ) -> None:
+        from ._compact import ColumnarEntries, CompactEntries
+
         self.path = path
 
-    def search(self, key_pattern: str, user_pattern: str) -> List[Entry]:
-        """Search database for given key and user pattern."""
-        # normalize key
+        # entries in columnar form (e.g., loaded lazily) are already normalized and sorted
+        if isinstance(entries, ColumnarEntries):
+            self.entries = entries  # type: Sequence[Entry]
+            self.keys = entries.keys
+            self.users = entries.users
+        else:
+            # normalize keys and sort entries accordingly (stability of sorted() ensures that the order of accounts for any given key remains untouched)
+            entries = sorted(
+                (_normalized_entry(e) for e in entries), key=attrgetter("key")
+            )
+
+            # optionally store entries in compact form (slower to access, but uses much less memory)
+            if compact:
+                self.entries = compact_entries = CompactEntries(entries)
+                self.keys = compact_entries.keys
+                self.users = compact_entries.users
+            else:
+                self.entries = entries
+                self.keys = _index.KeyString(e.key for e in entries)
+                self.users = _index.UserTable(e.user for e in entries)
+
+        # optionally build n-gram index to speed up repeated searches in large stores
+        self.index = None  # type: Optional[_index.NgramIndex]
+        if index:
+            with trace.span("index"):
+                self.index = _index.NgramIndex(self.keys, self.users)
+
+        # index of exact keys, built on first use (see get)
+        self.key_ranges = None  # type: Optional[Dict[str, Tuple[int, int]]]
+
+        # blocks of the source and their entries, if loaded incrementally (see reload)
+        self.parsed = None  # type: Optional[_ParsedSource]
+
+    def get(self, key: str, user: Optional[str] = None) -> List[Entry]:
+        """Return entries with precisely the given key (and user, if given)."""
+        with trace.span("search", mode="exact"):
+            # entries are sorted by key, so the entries for any given key form a contiguous range
+            if self.key_ranges is None:
+                key_ranges = {}  # type: Dict[str, Tuple[int, int]]
+                for idx, k in enumerate(self.keys):
+                    start, _ = key_ranges.get(k, (idx, idx))
+                    key_ranges[k] = (start, idx + 1)
+                self.key_ranges = key_ranges
+
+            start, end = self.key_ranges.get(_normalized_key(key), (0, 0))
+            users = self.users
+            return [
+                self.entries[idx]
+                for idx in range(start, end)
+                if user is None or users[idx] == user
+            ]
+
+    def search(
+        self,
+        key_pattern: str,
+        user_pattern: str,
+        regex: bool = False,
+        glob: bool = False,
+    ) -> List[Entry]:
+        """Search database for given key and user pattern (see iter_search)."""
+        return list(self.iter_search(key_pattern, user_pattern, regex, glob))
+
+    def iter_search(
+        self,
+        key_pattern: str,
+        user_pattern: str,
+        regex: bool = False,
+        glob: bool = False,
+    ) -> Iterator[Entry]:
+        """Search database for given key and user pattern, yielding results while searching.
+
+        Patterns match substrings of the key and user, or, if regex is set, are regular expressions
+        that match anywhere in the key and user, or, if glob is set, are shell-style wildcard
+        patterns that match the whole key and user. Keys are matched case-insensitively, and empty
+        patterns match any key and user.
+        """
+        if regex and glob:
+            raise ValueError("regex and glob patterns cannot be combined")
+        if regex or glob:
+            indices = self._iter_pattern_indices(key_pattern, user_pattern, glob)
+        else:
+            key_pattern = _normalized_key(key_pattern)
+            user_matches = self.users.matches(user_pattern)
+            indices = self._iter_indices(key_pattern, user_pattern, user_matches)
+
+        # entries are sorted by key, so results are as well
+        mode = "regex" if regex else "glob" if glob else "substring"
+        return trace.iter_span(
+            "search", (self.entries[idx] for idx in indices), mode=mode
+        )
+
+    def search_ranked(
+        self, key_pattern: str, user_pattern: str, limit: int = 10
+    ) -> List[Entry]:
+        """Search database for entries fuzzily matching given key and user pattern, returning the best limit results (best first).
+
+        Patterns match if their characters occur in order; matches at the start of the key or user
+        rank first, then matches at word boundaries, substring matches and finally other matches.
+        """
         key_pattern = _normalized_key(key_pattern)
+        user_scores = [_fuzzy_score(user_pattern, user) for user in self.users.distinct]
+
+        # score all candidates, but only keep the best ones in a heap (ties remain in key order)
+        def scored() -> Iterator[Tuple[int, int]]:
+            keys = self.keys
+            user_ids = self.users.ids
+            for idx in keys.find_subsequence(key_pattern):
+                user_score = user_scores[user_ids[idx]]
+                if user_score is None:
+                    continue
+                key_score = _fuzzy_score(key_pattern, keys[idx])
+                if key_score is not None:
+                    yield key_score + user_score, idx
+
+        with trace.span("search", mode="ranked"):
+            best = heapq.nlargest(limit, scored(), key=itemgetter(0))
+        return [self.entries[idx] for _, idx in best]
+
+    def search_many(self, queries: Iterable[Tuple[str, str]]) -> List[List[Entry]]:
+        """Search database for several pairs of key and user patterns, returning a list of results for each pair."""
+        queries = list(queries)
+        with trace.span("search", mode="many", queries=len(queries)):
+            # repeated queries are answered only once, and each distinct user pattern is tested only once
+            results = {}  # type: Dict[Tuple[str, str], List[Entry]]
+            user_matches = {}  # type: Dict[str, List[bool]]
+            all_results = []
+            for key_pattern, user_pattern in queries:
+                query = (_normalized_key(key_pattern), user_pattern)
+                if query not in results:
+                    if user_pattern not in user_matches:
+                        user_matches[user_pattern] = self.users.matches(user_pattern)
+                    indices = self._iter_indices(
+                        query[0], user_pattern, user_matches[user_pattern]
+                    )
+                    results[query] = [self.entries[idx] for idx in indices]
+                all_results.append(results[query])
+            return all_results
+
+    def _iter_indices(
+        self,
+        key_pattern: str,
+        user_pattern: str,
+        user_matches: List[bool],
+        start: int = 0,
+    ) -> Iterator[int]:
+        # restrict to candidates from index (if available)
+        candidates = None  # type: Optional[Sequence[int]]
+        if self.index is not None:
+            candidates = self.index.candidates(key_pattern, user_pattern)
+
+        # search columns of keys and (interned) users, testing each distinct user only once
+        user_ids = self.users.ids
+        if candidates is not None:
+            keys = self.keys
+            return (
+                idx
+                for idx in islice(candidates, bisect_left(candidates, start), None)
+                if user_matches[user_ids[idx]] and key_pattern in keys[idx]
+            )
+        return (
+            idx
+            for idx in self.keys.find(key_pattern, start)
+            if user_matches[user_ids[idx]]
+        )
 
-        # search
-        results = []
-        for entry in self.entries:
-            if key_pattern in entry.key and user_pattern in entry.user:
-                results.append(entry)
+    def _iter_pattern_indices(
+        self, key_pattern: str, user_pattern: str, glob: bool
+    ) -> Iterator[int]:
+        # compile patterns once, and test each distinct user only once
+        key_regex = _compile_pattern(key_pattern, glob, key=True)
+        user_regex = _compile_pattern(user_pattern, glob)
+        user_matches = [
+            user_regex is None or _pattern_matches(user_regex, user, glob)
+            for user in self.users.distinct
+        ]
 
-        # sort results according to key (stability of sorted() ensures that the order of accounts for any given key remains untouched)
-        return sorted(results, key=lambda e: e.key)
+        # only entries containing the literals of the patterns are candidates, which can be found
+        # like in a substring search (using the index, if available)
+        candidates = self._iter_indices(
+            _pattern_literal(key_pattern, glob, key=True),
+            _pattern_literal(user_pattern, glob),
+            user_matches,
+        )
+        if key_regex is None:
+            return candidates
+        keys = self.keys
+        return (
+            idx for idx in candidates if _pattern_matches(key_regex, keys[idx], glob)
+        )
+
+    def add(
+        self,
+        key: str,
+        user: str,
+        password: str,
+        notes: str = "",
+        recipient: Optional[str] = None,
+    ) -> None:
+        """Add entry, appending the change to the journal of the password file (encrypted for recipient if the file is encrypted).
+
+        Raises ValueError if there already is an entry with the given key and user.
+        """
+        if not key or not password:
+            raise ValueError("key and password must not be empty")
+        _check_formattable(Entry(key, user, password, notes))
+        if self.get(key, user):
+            raise ValueError("entry already exists (use update)")
+        self._write_change(
+            {
+                "op": "add",
+                "key": key,
+                "user": user,
+                "password": password,
+                "notes": notes,
+            },
+            recipient,
+        )
+
+    def update(
+        self,
+        key: str,
+        user: str,
+        password: Optional[str] = None,
+        notes: Optional[str] = None,
+        recipient: Optional[str] = None,
+    ) -> None:
+        """Change password and/or notes of the entries with precisely the given key and user (see add).
+
+        Raises KeyError if there is no such entry.
+        """
+        if password == "":
+            raise ValueError("password must not be empty")
+        _check_formattable(Entry(key, user, password or "", notes or ""))
+        if not self.get(key, user):
+            raise KeyError(key)
+        record = {"op": "update", "key": key, "user": user}
+        if password is not None:
+            record["password"] = password
+        if notes is not None:
+            record["notes"] = notes
+        self._write_change(record, recipient)
+
+    def remove(self, key: str, user: str, recipient: Optional[str] = None) -> None:
+        """Remove the entries with precisely the given key and user (see add).
+
+        Raises KeyError if there is no such entry.
+        """
+        if not self.get(key, user):
+            raise KeyError(key)
+        self._write_change({"op": "remove", "key": key, "user": user}, recipient)
+
+    def _write_change(self, record: Dict[str, str], recipient: Optional[str]) -> None:
+        from . import _journal
+
+        # only the change is written (and encrypted), while the columns and indices are rebuilt in
+        # memory (the parsed blocks remain those of the password file, which is unchanged)
+        _journal.append(self.path, record, recipient)
+        updated = _journal.replay_changes(self, _journal.fold([record]))
+        updated.parsed = self.parsed
+        self.__dict__.update(vars(updated))
 
     @staticmethod
-    def load(path: str) -> "Store":
-        """Load password store from file."""
-        # load source (decrypting if necessary)
-        if _gpg.is_encrypted(path):
-            src_bytes = _gpg.decrypt(path)
+    def load(
+        path: str,
+        index: bool = False,
+        compact: bool = False,
+        lazy: bool = False,
+        key_prefix: str = "",
+        cache: bool = False,
+        recipient: Optional[str] = None,
+        incremental: bool = False,
+    ) -> "Store":
+        """Load password store from file (or from a directory containing a sharded store).
+
+        In lazy mode, only keys and users are parsed upfront, while the source is kept in memory (or memory-mapped, if unencrypted) to parse each entry in full when accessed.
+        Large stores are parsed in parallel, in chunks.
+        For sharded stores, only shards that can contain keys starting with key_prefix are loaded (the store may contain other keys as well).
+        Stores in the per-entry encrypted format (.pwx) only decrypt passwords when entries are accessed.
+        If cache is set, entries are loaded in compact form from a compiled cache next to the file, which is updated (and encrypted for recipient) if the file has changed.
+        If incremental is set (and neither lazy nor cache), the source of a password file is parsed in blocks of entries, which are kept so that reload only parses the blocks that changed.
+        """
+        with trace.span("load", path=path):
+            store = Store._load(
+                path, index, compact, lazy, key_prefix, cache, recipient, incremental
+            )
+            return _replay_journal(store)
+
+    def reload(self) -> "Store":
+        """Load the current version of the password file of an incrementally loaded store (see load).
+
+        Only the blocks of entries that changed are parsed again. If only passwords and notes
+        changed, the new store moreover shares the keys, users and indices of this store. Otherwise,
+        the columns and indices are rebuilt from all entries (rather than updated in place), so
+        adding, removing or renaming entries costs about as much as sorting and indexing the store.
+        """
+        if self.parsed is None:
+            raise ValueError("store was not loaded incrementally")
+        with trace.span("load", path=self.path, incremental=True):
+            store = _parse_blocks(self.path, _load_source(self.path), self.parsed)
+            return _replay_journal(store)
+
+    @staticmethod
+    def _load(
+        path: str,
+        index: bool,
+        compact: bool,
+        lazy: bool,
+        key_prefix: str,
+        cache: bool,
+        recipient: Optional[str],
+        incremental: bool,
+    ) -> "Store":
+        if _is_pwx(path):
+            from ._pwx import PwxEntries
+
+            return Store(path, PwxEntries(path), index=index)
+        if cache and os.path.isfile(path):
+            from ._cache import load_entries
+
+            return Store(path, load_entries(path, recipient), index=index)
+        paths = _store_paths(path, key_prefix)
+        if lazy:
+            from ._compact import LazyEntries, MappedEntries
+
+            # unencrypted sources are memory-mapped rather than read and decoded in full
+            if len(paths) == 1 and not _gpg.is_encrypted(paths[0]):
+                buf = _map_source(paths[0])
+                if buf is not None:
+                    mapped = MappedEntries(buf, _iter_mapped_records(buf))
+                    return Store(path, mapped, index=index)
+
+            # a blank line between shards ensures that they are parsed independently
+            src = "\n\n".join(_load_source(p) for p in paths)
+            return Store(path, LazyEntries(src, _iter_lazy_records(src)), index=index)
+        if incremental and paths == [path]:
+            empty = _ParsedSource([], [], Store(path, [], index=index, compact=compact))
+            return _parse_blocks(path, _load_source(path), empty)
+        if len(paths) == 1 and _parse_in_parallel(paths[0]):
+            entries = _parse_entries_parallel(_load_source(paths[0]))
+            return Store(path, entries, index=index, compact=compact)
+        return Store(
+            path,
+            (entry for p in paths for entry in _iter_load(p)),
+            index=index,
+            compact=compact,
+        )
+
+    @staticmethod
+    def load_many(paths: Sequence[str], index: bool = False) -> "Store":
+        """Load several password stores (decrypting them concurrently) and merge them into a single store.
+
+        Each entry is a SourcedEntry whose source is the path of the password store it was loaded from.
+        """
+        from ._compact import SourcedEntries
+
+        def load_store(path: str) -> Store:
+            # stores in the per-entry encrypted format remain lazy, so that only the passwords of
+            # the entries that are accessed are decrypted
+            if _is_pwx(path):
+                from ._pwx import PwxEntries
+
+                return Store(path, PwxEntries(path))
+            return Store(path, Store.iter_load(path))
+
+        # gpg runs in a separate process, so decryptions proceed concurrently
+        from concurrent.futures import ThreadPoolExecutor  # slow to import
+
+        with trace.span("load", path=os.pathsep.join(paths)):
+            with ThreadPoolExecutor(max_workers=max(1, len(paths))) as executor:
+                entries = SourcedEntries(list(executor.map(load_store, paths)))
+            return Store(os.pathsep.join(paths), entries, index=index)
+
+    @staticmethod
+    def iter_load(path: str, key_prefix: str = "") -> Iterator[Entry]:
+        """Load password store entries from file (or sharded store), parsing while the file is being decrypted."""
+        from . import _journal
+
+        for p in _store_paths(path, key_prefix):
+            for entry in _journal.iter_load(p):
+                yield _normalized_entry(entry)
+
+
+class SearchSession:
+    """Search session for refining a search as its patterns are typed (e.g., in an interactive launcher).
+
+    The session remembers the entries found to match the previous patterns, and up to which entry
+    the store has been searched. If the new patterns contain the previous ones (e.g., because
+    characters were typed), only these entries are searched again, and the search of the rest of
+    the store resumes where it stopped; otherwise (e.g., because characters were deleted), the
+    search starts over. With a limit, the search stops as soon as there are enough results, so the
+    latency per keystroke does not grow with the size of the store.
+    """
+
+    def __init__(self, store: Store) -> None:
+        self.store = store
+        self.key_pattern = ""
+        self.user_pattern = ""
+        self.user_matches = store.users.matches("")
+        self.indices = []  # type: List[int]
+        self.searched = 0  # entries before this index have been searched
+
+    def search(
+        self, key_pattern: str, user_pattern: str = "", limit: Optional[int] = None
+    ) -> List[Entry]:
+        """Search database for given key and user pattern, returning at most limit results (if given)."""
+        with trace.span("search", mode="session"):
+            return self._search(key_pattern, user_pattern, limit)
+
+    def _search(
+        self, key_pattern: str, user_pattern: str, limit: Optional[int]
+    ) -> List[Entry]:
+        store = self.store
+        key_pattern = _normalized_key(key_pattern)
+
+        # distinct users are only tested again if the user pattern changed
+        if user_pattern != self.user_pattern:
+            self.user_matches = store.users.matches(user_pattern)
+        user_matches = self.user_matches
+
+        # every entry matching the new patterns also matches the previous ones if these are contained
+        if self.key_pattern in key_pattern and self.user_pattern in user_pattern:
+            keys = store.keys
+            user_ids = store.users.ids
+            indices = [
+                idx
+                for idx in self.indices
+                if user_matches[user_ids[idx]] and key_pattern in keys[idx]
+            ]
+            searched = self.searched
+        else:
+            indices = []
+            searched = 0
+
+        # search the rest of the store until there are enough results
+        if limit is None or len(indices) < limit:
+            start, searched = searched, len(store.entries)
+            for idx in store._iter_indices(
+                key_pattern, user_pattern, user_matches, start
+            ):
+                indices.append(idx)
+                if len(indices) == limit:
+                    searched = idx + 1
+                    break
+
+        self.key_pattern = key_pattern
+        self.user_pattern = user_pattern
+        self.indices = indices
+        self.searched = searched
+        return [store.entries[idx] for idx in indices[:limit]]
+
+
+class ReloadingStore:
+    """Password store that is reloaded in a background thread whenever its file (or journal) changes, e.g., after pw --edit.
+
+    The file is checked every interval seconds, and reloaded with the given options of Store.load
+    (incrementally by default, so that only the entries that changed are parsed again).
+    Once a new version has been loaded, it replaces the current store at once, so searches never
+    wait for a reload and never see a partially loaded store. If loading fails (e.g., because of a
+    syntax error), the previous version is kept and the error is kept in error until the file changes again.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0, **options: Any) -> None:
+        self.path = path
+        self.interval = interval
+        self.options = options
+        self.error = None  # type: Optional[Exception]
+        options.setdefault("incremental", True)
+        self.signature = _store_signature(path)
+        self.store = Store.load(path, **options)
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._watch, name="pw-reload", daemon=True
+        )
+        self.thread.start()
+
+    def _watch(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.reload_if_changed()
+
+    def reload_if_changed(self) -> bool:
+        """Reload store if its file has changed since it was last loaded, and return whether it was reloaded."""
+        try:
+            signature = _store_signature(self.path)
+        except OSError:
+            # e.g., while the file is being replaced
+            return False
+        if signature == self.signature:
+            return False
+
+        # the signature is taken before loading, so that changes made while loading trigger another reload
+        self.signature = signature
+        try:
+            if self.store.parsed is not None:
+                store = self.store.reload()
+            else:
+                store = Store.load(self.path, **self.options)
+        except Exception as e:
+            self.error = e
+            return False
+        self.store = store
+        self.error = None
+        return True
+
+    def close(self) -> None:
+        """Stop watching the file."""
+        self.stopped.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def __enter__(self) -> "ReloadingStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @property
+    def entries(self) -> Sequence[Entry]:
+        return self.store.entries
+
+    def get(self, key: str, user: Optional[str] = None) -> List[Entry]:
+        """Return entries with precisely the given key (and user, if given) of the current store (see Store.get)."""
+        return self.store.get(key, user)
+
+    def search(
+        self,
+        key_pattern: str,
+        user_pattern: str,
+        regex: bool = False,
+        glob: bool = False,
+    ) -> List[Entry]:
+        """Search the current store (see Store.search)."""
+        return self.store.search(key_pattern, user_pattern, regex, glob)
+
+    def iter_search(
+        self,
+        key_pattern: str,
+        user_pattern: str,
+        regex: bool = False,
+        glob: bool = False,
+    ) -> Iterator[Entry]:
+        """Search the current store, yielding results while searching (see Store.iter_search).
+
+        The search continues in the store it started in, even if the store is reloaded meanwhile.
+        """
+        return self.store.iter_search(key_pattern, user_pattern, regex, glob)
+
+    def search_ranked(
+        self, key_pattern: str, user_pattern: str, limit: int = 10
+    ) -> List[Entry]:
+        """Search the current store fuzzily (see Store.search_ranked)."""
+        return self.store.search_ranked(key_pattern, user_pattern, limit)
+
+    def search_many(self, queries: Iterable[Tuple[str, str]]) -> List[List[Entry]]:
+        """Search the current store for several pairs of patterns (see Store.search_many)."""
+        return self.store.search_many(queries)
+
+
+class _ParsedSource:
+    # blocks of source (see _split_blocks) with their (normalized) entries, and the store of these entries
+    def __init__(
+        self, blocks: List[str], block_entries: List[List[Entry]], store: Store
+    ) -> None:
+        self.blocks = blocks
+        self.block_entries = block_entries
+        self.store = store
+
+
+def _replay_journal(store: Store) -> Store:
+    # replay changes that have not been compacted into the file yet
+    if not os.path.isfile(store.path) or _is_pwx(store.path):
+        return store
+    from . import _journal
+
+    replayed = _journal.replay(store)
+    replayed.parsed = store.parsed
+    return replayed
+
+
+def _store_paths(path: str, key_prefix: str) -> List[str]:
+    if os.path.isdir(path):
+        from . import _shards
+
+        return _shards.shard_paths(path, _normalized_key(key_prefix))
+    return [path]
+
+
+def _stat_signature(path: str) -> Tuple[int, int, int]:
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _store_signature(path: str) -> Tuple[Tuple[int, int, int], ...]:
+    """Return signature of a password store and its journal, which changes whenever either of them is changed or replaced."""
+    from ._journal import journal_path
+
+    # records added to (or removed from) the journal change the modification time of its directory
+    signatures = [_stat_signature(path)]
+    if os.path.isdir(journal_path(path)):
+        signatures.append(_stat_signature(journal_path(path)))
+    return tuple(signatures)
+
+
+def _check_ext(path: str) -> None:
+    ext = _gpg.unencrypted_ext(path)
+    assert ext not in [
+        ".yml",
+        ".yaml",
+    ], "YAML support was removed in version 0.12.0"
+
+
+def _is_pwx(path: str) -> bool:
+    _, ext = os.path.splitext(path)
+    return ext == ".pwx"
+
+
+def _write_file(
+    path: str, content: bytes, recipient: Optional[str], mode: Optional[int] = None
+) -> None:
+    """Atomically write content to file (encrypting for recipient if the file extension asks for it).
+
+    The file gets the given permissions, and otherwise those of the file it replaces (or 0600 if there is none).
+    """
+    if _gpg.is_encrypted(path) and not recipient:
+        raise ValueError("no recipient to encrypt '%s' for" % path)
+    if mode is None:
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o600
+
+    # the temporary file is private from the start, and unique (so that concurrent writers never
+    # write to the same one)
+    dirname, filename = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(
+        prefix="tmp-", suffix="-" + filename, dir=dirname or os.curdir
+    )
+    try:
+        if recipient and _gpg.is_encrypted(path):
+            os.close(fd)
+            _gpg.encrypt(recipient=recipient, dest_path=tmp_path, content=content)
         else:
-            src_bytes = open(path, "rb").read()
-        src = src_bytes.decode("utf-8")
+            with open(fd, "wb") as fp:
+                fp.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _load_source(path: str) -> str:
+    _check_ext(path)
+
+    # load source (decrypting if necessary)
+    if _gpg.is_encrypted(path):
+        src_bytes = _gpg.decrypt(path)
+    else:
+        with open(path, "rb") as fp:
+            src_bytes = fp.read()
+    return src_bytes.decode("utf-8")
+
+
+def _iter_load(path: str) -> Iterator[Entry]:
+    _check_ext(path)
+
+    # the per-entry encrypted format stores (and decrypts) each password separately
+    if _is_pwx(path):
+        from ._pwx import PwxEntries
+
+        yield from PwxEntries(path).iter_original()
+        return
+
+    # parse database source while loading it (decrypting if necessary)
+    if _gpg.is_encrypted(path):
+        with _gpg.decrypt_stream(path) as stream:
+            yield from trace.iter_span("parse", _iter_entries(_iter_lines(stream)))
+    else:
+        with open(path, "rb") as stream:
+            yield from trace.iter_span("parse", _iter_entries(_iter_lines(stream)))
+
+
+def _iter_lines(stream: IO[bytes]) -> Iterator[str]:
+    # newline="" splits only at \r, \n and \r\n, so splitting each line once more yields precisely
+    # the lines of str.splitlines() for the full source
+    for line in io.TextIOWrapper(stream, encoding="utf-8", newline=""):
+        yield from line.splitlines()
+
+
+def _compile_pattern(
+    pattern: str, glob: bool, key: bool = False
+) -> Optional[Pattern[str]]:
+    """Compile regular expression (or shell-style wildcard pattern, if glob is set) for matching keys or users (returns None if the pattern is empty)."""
+    if not pattern:
+        return None
+    if glob:
+        # keys are normalized, so patterns for keys are as well
+        return re.compile(
+            fnmatch.translate(_normalized_key(pattern) if key else pattern)
+        )
+    return re.compile(pattern, re.IGNORECASE if key else 0)
 
-        # parse database source
-        ext = _gpg.unencrypted_ext(path)
-        assert ext not in [
-            ".yml",
-            ".yaml",
-        ], "YAML support was removed in version 0.12.0"
-        entries = _parse_entries(src)
 
-        return Store(path, entries)
+def _pattern_matches(regex: Pattern[str], string: str, glob: bool) -> bool:
+    # wildcard patterns match whole strings, while regular expressions match anywhere
+    return bool(regex.match(string) if glob else regex.search(string))
+
+
+def _pattern_literal(pattern: str, glob: bool, key: bool = False) -> str:
+    """Return the longest literal that every match of a regular expression (or shell-style wildcard pattern, if glob is set) contains, normalized for matching keys if key is set."""
+    if glob:
+        # a character class matches a single character (and an unclosed bracket is ignored)
+        pattern = _normalized_key(pattern) if key else pattern
+        literals = re.split(r"[*?]|\[!?\]?[^\]]*\]|\[", pattern)
+    else:
+        literals = _regex_literals(pattern)
+        if key:
+            # ignoring case, "i" and "s" also match "ı" and "ſ", which normalized keys may contain
+            literals = re.split("[is\n]", "\n".join(literals).lower())
+    return max(literals, key=len, default="")
+
+
+_REGEX_NON_LITERAL_ESCAPES = "xuUN0123456789"
+_REGEX_QUANTIFIER_RE = re.compile(r"\{\d*(,\d*)?\}")
+
+
+def _regex_literals(pattern: str) -> List[str]:
+    # conservatively collect runs of literal (ASCII) characters outside of groups, which every match
+    # contains, giving up on alternatives and inline flags
+    if re.search(r"\(\?[aiLmsux]", pattern):
+        return []
+    literals = [""]
+    depth = 0
+    pos = 0
+    while pos < len(pattern):
+        c = pattern[pos]
+        literal = None  # type: Optional[str]
+        pos += 1
+        if c == "\\":
+            escaped = pattern[pos : pos + 1]
+            pos += 1
+            if escaped in _REGEX_NON_LITERAL_ESCAPES:
+                return []
+            if not escaped.isalnum():
+                literal = escaped
+        elif c == "[":
+            # skip character class (in which a leading "]" is literal)
+            pos += pattern[pos : pos + 1] == "^"
+            pos += pattern[pos : pos + 1] == "]"
+            while pos < len(pattern) and pattern[pos] != "]":
+                pos += 2 if pattern[pos] == "\\" else 1
+            pos += 1
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|":
+            if depth == 0:
+                return []
+        elif c in "*?{":
+            # the preceding character is optional (or, for {m,n}, its count is not known)
+            if c == "{":
+                quantifier = _REGEX_QUANTIFIER_RE.match(pattern, pos - 1)
+                if quantifier:
+                    pos = quantifier.end()
+            if depth == 0 and literals[-1]:
+                literals[-1] = literals[-1][:-1]
+        elif c not in ".^$+" and c.isascii():
+            literal = c
+
+        if literal is not None and depth == 0:
+            literals[-1] += literal
+        elif literals[-1]:
+            literals.append("")
+    return [literal for literal in literals if literal]
+
+
+_SCORE_SCALE = 1 << 16
+
+
+def _fuzzy_score(pattern: str, string: str) -> Optional[int]:
+    """Return how well pattern matches string (higher is better), or None if the characters of pattern do not occur in string in order."""
+    if not pattern:
+        return 0
+    pos = string.find(pattern)
+    if pos == 0:
+        kind = 3
+    elif pos > 0:
+        # prefer matches at word boundaries (e.g., after "." or "@")
+        kind = 1 if string[pos - 1].isalnum() else 2
+    else:
+        pos = -1
+        for c in pattern:
+            pos = string.find(c, pos + 1)
+            if pos < 0:
+                return None
+        kind = 0
+
+    # among matches of the same kind, prefer shorter strings
+    return kind * _SCORE_SCALE - min(len(string), _SCORE_SCALE - 1)
 
 
 class SyntaxError(Exception):
@@ -59,17 +865,159 @@ class SyntaxError(Exception):
         super(SyntaxError, self).__init__(
             "line %s: %s (%r)" % (lineno + 1, reason, line)
         )
+        self.lineno = lineno
+        self.line = line
+        self.reason = reason
+
+    def __reduce__(self):  # type: ignore
+        # pickle the constructor arguments rather than the message (for parsing in worker processes)
+        return SyntaxError, (self.lineno, self.line, self.reason)
 
 
 _EXPECT_ENTRY = "expecting entry"
 _EXPECT_ENTRY_OR_NOTES = "expecting entry or notes"
 
 
+# an entry line is split into (at most) three shell-like tokens (key, user and password) followed
+# by free-form notes; the tokenizer below implements the relevant subset of shlex.shlex(posix=True)
+# with whitespace_split=True, i.e., single and double quotes, backslash escapes, and comments
+_SPECIAL_CHARS_RE = re.compile(r"[\\'\"#\x1f]")
+_WHITESPACE_RE = re.compile(r"[ \t]+")
+_TOKEN_PIECE_RE = re.compile(r"""[^ \t'"\\#]+|'[^']*'|"(?:[^"\\]|\\.)*"|\\.""")
+_UNTERMINATED_DOUBLE_QUOTE_RE = re.compile(r'"(?:[^"\\]|\\.)*')
+_DOUBLE_QUOTE_ESCAPE_RE = re.compile(r'\\(["\\])')
+
+
+def _tokenize_entry(line: str) -> Tuple[str, Optional[str], Optional[str], str]:
+    """Split entry line into key, user, password (None if missing) and the remaining notes.
+
+    Raises ValueError with the same messages as shlex if a quotation or escape is not terminated.
+    """
+    if _SPECIAL_CHARS_RE.search(line):
+        return _tokenize_entry_slow(line)
+
+    # fast path: no quotes, escapes or comments (str.split agrees with shlex for ASCII whitespace)
+    if line.isascii():
+        parts = line.split(None, 3)
+    else:
+        parts = _WHITESPACE_RE.split(line, 3)
+        if not parts[-1]:
+            parts.pop()
+
+    rest = parts[3] if len(parts) == 4 else ""
+    parts += [None] * (3 - len(parts))  # type: ignore
+    return parts[0], parts[1], parts[2], rest
+
+
+def _tokenize_entry_slow(line: str) -> Tuple[str, Optional[str], Optional[str], str]:
+    tokens = []  # type: List[Optional[str]]
+    pos, end = 0, len(line)
+    while len(tokens) < 3:
+        # skip whitespace; a comment extends until the end of the line
+        while pos < end and line[pos] in " \t":
+            pos += 1
+        if pos == end or line[pos] == "#":
+            pos = end
+            break
+
+        # concatenate unquoted, quoted and escaped pieces until the next whitespace
+        pieces = []
+        while pos < end:
+            c = line[pos]
+            if c in " \t":
+                pos += 1
+                break
+            if c == "#":
+                pos = end
+                break
+            m = _TOKEN_PIECE_RE.match(line, pos)
+            if not m:
+                if c == "\\" or (
+                    c == '"' and _UNTERMINATED_DOUBLE_QUOTE_RE.match(line, pos).end() < end  # type: ignore
+                ):
+                    raise ValueError("No escaped character")
+                raise ValueError("No closing quotation")
+            piece = m.group()
+            pos = m.end()
+            if c == "'":
+                piece = piece[1:-1]
+            elif c == '"':
+                piece = _DOUBLE_QUOTE_ESCAPE_RE.sub(r"\1", piece[1:-1])
+            elif c == "\\":
+                piece = piece[1]
+            pieces.append(piece)
+        tokens.append("".join(pieces))
+
+    rest = line[pos:] if len(tokens) == 3 else ""
+    tokens += [None] * (3 - len(tokens))
+    return tokens[0], tokens[1], tokens[2], rest  # type: ignore
+
+
+def _parse_entry_line(lineno: int, line: str, state: str) -> Tuple[str, str, str, str]:
+    try:
+        key, user, password, rest = _tokenize_entry(line)
+    except ValueError as e:
+        raise SyntaxError(lineno, line, str(e))
+    key = key.rstrip(":")
+    assert key
+
+    if not user and not password:
+        raise SyntaxError(lineno, line, state)
+
+    if not password:
+        return key, "", user, ""  # type: ignore
+    return key, user, password, rest.strip()  # type: ignore
+
+
+def _check_formattable(entry: Entry) -> None:
+    """Raise ValueError unless entry can be formatted as source that parses back into it."""
+    for field in ["key", "user", "password"]:
+        value = getattr(entry, field)
+        if "".join(value.splitlines()) != value:
+            raise ValueError("%s must not contain line breaks" % field)
+    if entry.key.endswith(":"):
+        raise ValueError(
+            "key must not end with ':'"
+        )  # the colon that ends the key is stripped
+
+    # notes lines are stripped, and empty lines terminate the notes
+    lines = entry.notes.splitlines()
+    if "\n".join(lines) != entry.notes or any(
+        not line or line.strip() != line for line in lines
+    ):
+        raise ValueError(
+            "notes must not contain empty lines or lines with leading or trailing whitespace"
+        )
+
+
+def _format_entries(entries: Iterable[Entry]) -> str:
+    """Format entries as source that parses back into the same entries.
+
+    Raises ValueError if an entry cannot be formatted (see _check_formattable).
+    """
+    lines = []
+    for entry in entries:
+        _check_formattable(entry)
+        fields = [shlex.quote(entry.key) + ":", shlex.quote(entry.password)]
+        if entry.user:
+            fields.insert(1, shlex.quote(entry.user))
+        lines.append(" ".join(fields))
+        lines += ["  " + line for line in entry.notes.splitlines()]
+    return "".join(line + "\n" for line in lines)
+
+
 def _parse_entries(src: str) -> List[Entry]:
-    entries = []  # type: List[Entry]
-    state = _EXPECT_ENTRY
+    with trace.span("parse"):
+        return list(_iter_entries(src.splitlines()))
+
 
-    for lineno, line in enumerate(src.splitlines()):
+def _iter_entries(lines: Iterable[str], state: str = _EXPECT_ENTRY) -> Iterator[Entry]:
+    # the most recent entry is only yielded once it can no longer receive any notes, which are
+    # collected line by line and joined only once (rather than concatenated line by line)
+    entry = None  # type: Optional[Entry]
+    notes = []  # type: List[str]
+
+    for lineno, line in enumerate(lines):
         # empty lines are skipped (but also terminate the notes section)
         sline = line.strip()
         if not sline or line.startswith("#"):
@@ -82,46 +1030,292 @@ def _parse_entries(src: str) -> List[Entry]:
                 raise SyntaxError(lineno, line, state)
 
             # add line of notes
-            notes = entries[-1].notes
-            if notes:
-                notes += "\n"
-            notes += sline
-            entries[-1] = entries[-1]._replace(notes=notes)
+            notes.append(sline)
             continue
 
         # otherwise, parse as an entry
-        sio = StringIO(line)
-        lexer = shlex(sio, posix=True)  # type: ignore
-        lexer.whitespace_split = True
+        key, user, password, first_notes = _parse_entry_line(lineno, line, state)
 
-        try:
-            key = lexer.get_token()
-        except ValueError as e:
-            raise SyntaxError(lineno, line, str(e))
-        key = key.rstrip(":")
-        assert key
+        if entry is not None:
+            yield _with_notes(entry, notes)
+        entry = Entry(key, user, password, first_notes)
+        notes = [first_notes] if first_notes else []
+        state = _EXPECT_ENTRY_OR_NOTES
+
+    if entry is not None:
+        yield _with_notes(entry, notes)
 
-        try:
-            user = lexer.get_token()
-        except ValueError as e:
-            raise SyntaxError(lineno, line, str(e))
 
+def _with_notes(entry: Entry, notes: List[str]) -> Entry:
+    # notes are either empty or just the notes from the entry line
+    if not notes or (len(notes) == 1 and notes[0] is entry.notes):
+        return entry
+    return entry._replace(notes="\n".join(notes))
+
+
+# a line that neither continues notes nor is empty starts a new block, which is parsed independently
+# of the blocks before it (since its first line is either an entry or a comment)
+_BLOCK_START_RE = re.compile(r"\n(?=[^ \t\r\n])")
+
+
+def _split_blocks(src: str) -> List[str]:
+    return _BLOCK_START_RE.split(src)
+
+
+def _parse_blocks(path: str, src: str, previous: _ParsedSource) -> Store:
+    """Parse source of a password file, reusing the entries of the blocks of the previous version of the source that did not change."""
+    blocks = _split_blocks(src)
+    old_blocks = previous.blocks
+
+    # only the blocks between the longest unchanged prefix and suffix changed (although blocks
+    # in between may just have moved, which is why they are looked up by content)
+    n = min(len(blocks), len(old_blocks))
+    differs = list(map(ne, blocks, old_blocks))
+    start = differs.index(True) if True in differs else n
+    differs = list(map(ne, reversed(blocks), reversed(old_blocks)))
+    end = min(differs.index(True) if True in differs else n, n - start)
+    old_stop, stop = len(old_blocks) - end, len(blocks) - end
+
+    # the entries of each previous block are reused at most once (even if the source contains
+    # identical blocks), so that no two entries of the store are the same object (see below)
+    known = {}  # type: Dict[str, List[List[Entry]]]
+    for block, entries in zip(
+        old_blocks[start:old_stop], previous.block_entries[start:old_stop]
+    ):
+        known.setdefault(block, []).append(entries)
+    changed = []  # type: List[List[Entry]]
+    with trace.span("parse", blocks=stop - start):
+        for block in blocks[start:stop]:
+            reusable = known.get(block)
+            if reusable:
+                entries = reusable.pop(0)
+            else:
+                try:
+                    entries = [
+                        _normalized_entry(e) for e in _iter_entries(block.splitlines())
+                    ]
+                except SyntaxError:
+                    # parse the full source for the line number (and state) of the error
+                    _parse_entries(src)
+                    raise
+            changed.append(entries)
+    block_entries = (
+        previous.block_entries[:start] + changed + previous.block_entries[old_stop:]
+    )
+
+    # if only passwords and notes changed, the entries take the places of the previous ones, and
+    # the columns and indices of the previous store remain valid
+    store = previous.store
+    old_entries = [e for es in previous.block_entries[start:old_stop] for e in es]
+    new_entries = [e for es in changed for e in es]
+    if isinstance(store.entries, list) and [e[:2] for e in old_entries] == [
+        e[:2] for e in new_entries
+    ]:
+        replacements = []  # type: List[Tuple[int, Entry]]
+        for old, new in zip(old_entries, new_entries):
+            if old is not new:
+                idx = bisect_left(store.keys, old.key)
+                while store.entries[idx] is not old:
+                    idx += 1
+                replacements.append((idx, new))
+        entries = list(store.entries)
+        for idx, new in replacements:
+            entries[idx] = new
+        updated = copy.copy(store)
+        updated.entries = entries
+    else:
+        from ._compact import CompactEntries
+
+        updated = Store(
+            path,
+            (e for es in block_entries for e in es),
+            index=store.index is not None,
+            compact=isinstance(store.entries, CompactEntries),
+        )
+    updated.parsed = _ParsedSource(blocks, block_entries, updated)
+    return updated
+
+
+_PARALLEL_MIN_SIZE = 8 * 1024 * 1024  # bytes (of the password file)
+_PARALLEL_CHUNK_SIZE = 2 * 1024 * 1024  # characters
+
+
+def _parse_in_parallel(path: str) -> bool:
+    # starting a process pool only pays off for large stores (the size of an encrypted file
+    # underestimates the size of its source, since gpg compresses)
+    return (os.cpu_count() or 1) > 1 and os.path.getsize(path) >= _PARALLEL_MIN_SIZE
+
+
+def _split_chunks(src: str, chunk_size: int) -> Iterator[Tuple[str, str]]:
+    """Split source into chunks of roughly chunk_size characters, together with the parser state at the start of each chunk.
+
+    Chunks are only split before lines that are not notes, so that each chunk can be parsed on its own.
+    """
+    start = 0
+    state = _EXPECT_ENTRY
+    while start < len(src):
+        # find the first line break after chunk_size characters that is not followed by notes
+        pos = src.find("\n", start + chunk_size)
+        while pos >= 0 and src[pos + 1 : pos + 2] in (" ", "\t"):
+            pos = src.find("\n", pos + 1)
+        end = len(src) if pos < 0 else pos + 1
+        yield src[start:end], state
+
+        # the state after the last line of the chunk (unless it is the last chunk)
+        last_start = max(start, src.rfind("\n", start, end - 1) + 1)
+        last_lines = src[last_start:end].splitlines()
+        last_line = last_lines[-1] if last_lines else ""
+        if not last_line.strip() or last_line.startswith("#"):
+            state = _EXPECT_ENTRY
+        else:
+            state = _EXPECT_ENTRY_OR_NOTES
+        start = end
+
+
+def _parse_chunk(chunk: str, state: str) -> Tuple[List[Tuple[str, ...]], int]:
+    # return columns rather than a list of entries, since the former are much faster to pickle
+    lines = chunk.splitlines()
+    return list(zip(*_iter_entries(lines, state))), len(lines)
+
+
+def _parse_entries_parallel(
+    src: str,
+    chunk_size: int = _PARALLEL_CHUNK_SIZE,
+    max_workers: Optional[int] = None,
+) -> List[Entry]:
+    """Parse source like _parse_entries, but in chunks that are parsed in a process pool."""
+    # imported here, since multiprocessing is slow to import (and rarely needed)
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = list(_split_chunks(src, chunk_size))
+    if len(chunks) <= 1:
+        return _parse_entries(src)
+
+    entries = []  # type: List[Entry]
+    with trace.span("parse", chunks=len(chunks)):
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = [executor.submit(_parse_chunk, *chunk) for chunk in chunks]
+
+            # merge in order, reporting the first syntax error with line numbers relative to the full source
+            lineno = 0
+            for future in futures:
+                try:
+                    columns, num_lines = future.result()
+                except SyntaxError as e:
+                    for f in futures:
+                        f.cancel()
+                    raise SyntaxError(lineno + e.lineno, e.line, e.reason) from None
+                if columns:
+                    entries += map(Entry, *columns)
+                lineno += num_lines
+    return entries
+
+
+_LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+_LINE_BREAKS_OTHER_THAN_NEWLINE_RE = re.compile("[%s]" % _LINE_BREAKS[1:])
+
+
+def _iter_lines_with_spans(src: str) -> Iterator[Tuple[int, int, str]]:
+    # yields the same lines as str.splitlines(), together with their start and end offsets
+    pos = 0
+    if not _LINE_BREAKS_OTHER_THAN_NEWLINE_RE.search(src):
+        for line in src.split("\n"):
+            yield pos, pos + len(line), line
+            pos += len(line) + 1
+    else:
+        for line in src.splitlines(True):
+            stripped = line.rstrip(_LINE_BREAKS)
+            yield pos, pos + len(stripped), stripped
+            pos += len(line)
+
+
+_LINE_BREAKS_OTHER_THAN_NEWLINE_UTF8_RE = re.compile(
+    b"[\r\x0b\x0c\x1c\x1d\x1e]|\xc2\x85|\xe2\x80[\xa8\xa9]"
+)
+
+
+def _map_source(path: str) -> Optional[mmap.mmap]:
+    """Memory-map unencrypted source (returns None if it is empty or contains line breaks other than newlines)."""
+    _check_ext(path)
+    with open(path, "rb") as fp:
         try:
-            password = lexer.get_token()
-        except ValueError as e:
-            raise SyntaxError(lineno, line, str(e))
+            buf = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+    if _LINE_BREAKS_OTHER_THAN_NEWLINE_UTF8_RE.search(buf):
+        buf.close()
+        return None
+    return buf
+
+
+_MAPPED_BLOCK_SIZE = 1 << 20  # bytes
+
+
+def _iter_mapped_lines(buf: mmap.mmap) -> Iterator[Tuple[int, int, str]]:
+    # yields the same lines as _iter_lines_with_spans for the decoded source, but with spans in
+    # bytes, decoding one block of lines at a time (the source must not contain line breaks other
+    # than newlines, which never occur within multibyte characters)
+    pos = 0
+    while pos < len(buf):
+        end = buf.find(b"\n", pos + _MAPPED_BLOCK_SIZE)
+        end = len(buf) if end < 0 else end + 1
+        block = buf[pos:end]
+        is_ascii = block.isascii()
+        lines = block.decode("utf-8").split("\n")
+        if block.endswith(b"\n"):
+            lines.pop()
+        for line in lines:
+            size = len(line) if is_ascii else len(line.encode("utf-8"))
+            yield pos, pos + size, line
+            pos += size + 1
 
-        if not user and not password:
-            raise SyntaxError(lineno, line, state)
 
-        if not password:
-            password = user
-            user = notes = ""
+def _iter_lazy_records(src: str) -> Iterator[Tuple[str, str, int, int]]:
+    """Parse source like _parse_entries, but only yield key, user and the span of source to parse the full entry from."""
+    return _iter_records(_iter_lines_with_spans(src))
+
+
+def _iter_mapped_records(buf: mmap.mmap) -> Iterator[Tuple[str, str, int, int]]:
+    """Parse memory-mapped source like _iter_lazy_records, but yield spans in bytes."""
+    return _iter_records(_iter_mapped_lines(buf))
+
+
+def _iter_records(
+    lines: Iterable[Tuple[int, int, str]],
+) -> Iterator[Tuple[str, str, int, int]]:
+    record = None  # type: Optional[Tuple[str, str, int]]
+    record_end = 0
+    state = _EXPECT_ENTRY
+
+    for lineno, (start, end, line) in enumerate(lines):
+        # the same rules as in _iter_entries apply, but notes are only validated
+        if not line.strip() or line.startswith("#"):
+            state = _EXPECT_ENTRY
+            continue
+        if line[0] in [" ", "\t"]:
+            if state != _EXPECT_ENTRY_OR_NOTES:
+                raise SyntaxError(lineno, line, state)
+            record_end = end
+            continue
+
+        # fast path: there is no need to split off the password and notes if there are no quotes, escapes or comments
+        parts = line.split(None, 2)
+        if (
+            line.isascii()
+            and len(parts) > 1
+            and parts[0].rstrip(":")
+            and not _SPECIAL_CHARS_RE.search(line)
+        ):
+            key = parts[0].rstrip(":")
+            user = parts[1] if len(parts) == 3 else ""
         else:
-            password = password
-            notes = sio.read().strip()
+            key, user, _, _ = _parse_entry_line(lineno, line, state)
 
-        entries.append(Entry(key, user, password, notes))
+        if record is not None:
+            yield record + (record_end,)
+        record = (_normalized_key(key), user, start)
+        record_end = end
         state = _EXPECT_ENTRY_OR_NOTES
 
-    return entries
+    if record is not None:
+        yield record + (record_end,)
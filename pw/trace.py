@@ -0,0 +1,135 @@
+"""Opt-in timing of the phases of loading and searching password stores.
+
+Phases are timed as spans (e.g., "gpg.decrypt", "parse" or "search") and reported to hooks, which
+are called with the name of the span, its start (in seconds, as given by time.perf_counter), its
+duration (in seconds) and a dictionary of attributes (e.g., the path of a decrypted file). Spans
+never contain patterns or passwords. Without hooks, spans cost next to nothing.
+
+For example, to forward spans to metrics of your own:
+
+    from pw import trace
+    trace.add_hook(lambda name, start, duration, attrs: histogram(name).observe(duration))
+"""
+
+from contextlib import contextmanager
+import json, os, threading, time
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+    TypeVar,
+)
+
+Hook = Callable[[str, float, float, Dict[str, Any]], None]
+T = TypeVar("T")
+
+_hooks = []  # type: List[Hook]
+
+
+def add_hook(hook: Hook) -> None:
+    """Report all spans to hook from now on."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    _hooks.remove(hook)
+
+
+def _report(name: str, start: float, duration: float, attrs: Dict[str, Any]) -> None:
+    for hook in list(_hooks):
+        hook(name, start, duration, attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Time the enclosed code as a span of given name (if there are hooks)."""
+    if not _hooks:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _report(name, start, time.perf_counter() - start, attrs)
+
+
+def iter_span(name: str, iterable: Iterable[T], **attrs: Any) -> Iterator[T]:
+    """Time the iteration over iterable (e.g., a lazy search) as a span of given name (if there are hooks).
+
+    Only the time spent in the iterable counts, and the span is reported once the iteration is
+    finished (or abandoned).
+    """
+    if not _hooks:
+        return iter(iterable)
+    return _iter_span(name, iter(iterable), attrs)
+
+
+def _iter_span(name: str, it: Iterator[T], attrs: Dict[str, Any]) -> Iterator[T]:
+    first = time.perf_counter()
+    duration = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                duration += time.perf_counter() - start
+            yield item
+    finally:
+        _report(name, first, duration, attrs)
+
+
+class Recorder:
+    """Hook that records spans, so that they can be reported at once (e.g., when pw exits)."""
+
+    def __init__(self) -> None:
+        self.spans = []  # type: List[Tuple[str, float, float, Dict[str, Any], int]]
+
+    def __call__(
+        self, name: str, start: float, duration: float, attrs: Dict[str, Any]
+    ) -> None:
+        self.spans.append((name, start, duration, attrs, threading.get_ident()))
+
+    def write_summary(self, fp: IO[str]) -> None:
+        """Write spans in order of their start, indented by nesting."""
+        ends = []  # type: List[float]
+        for name, start, duration, attrs, _ in sorted(
+            self.spans, key=lambda s: (s[1], -s[2])
+        ):
+            while ends and ends[-1] <= start:
+                ends.pop()
+            details = ", ".join("%s=%s" % item for item in sorted(attrs.items()))
+            fp.write(
+                "%10.2fms  %s%s%s\n"
+                % (
+                    1e3 * duration,
+                    "  " * len(ends),
+                    name,
+                    " (%s)" % details if details else "",
+                )
+            )
+            ends.append(start + duration)
+
+    def write_json(self, fp: IO[str]) -> None:
+        """Write spans in the trace event format (which, e.g., chrome://tracing and Perfetto display)."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": 1e6 * start,
+                "dur": 1e6 * duration,
+                "pid": pid,
+                "tid": tid,
+                "args": attrs,
+            }
+            for name, start, duration, attrs, tid in self.spans
+        ]
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp, indent=1)
@@ -0,0 +1,93 @@
+import os, os.path, shutil, stat
+import pytest
+from pw import _cache
+from pw.store import Store, _load_source, _write_file
+
+RECIPIENT = "test.user@localhost"
+
+
+@pytest.fixture(params=["db.pw", "db.pw.gpg"])
+def store_path(request, tmp_path, dirname):
+    path = str(tmp_path / request.param)
+    shutil.copy(os.path.join(dirname, request.param), path)
+    return path
+
+
+def test_load(store_path, monkeypatch):
+    expected = Store.load(store_path).entries
+    store = Store.load(store_path, cache=True, recipient=RECIPIENT)
+    assert list(store.entries) == expected
+    assert os.path.exists(_cache.cache_path(store_path))
+
+    # the second load does not parse the store
+    def fail(path):
+        raise AssertionError("store was parsed")
+
+    monkeypatch.setattr(_cache, "_iter_load", fail)
+    store = Store.load(store_path, cache=True, recipient=RECIPIENT)
+    assert list(store.entries) == expected
+    assert store.search("oggle", "bob") == [expected[1]]
+
+
+def test_invalidation(store_path):
+    Store.load(store_path, cache=True, recipient=RECIPIENT)
+    src = _load_source(store_path) + "fancy_new_entry: user pass\n"
+    _write_file(store_path, src.encode("utf-8"), RECIPIENT)
+    store = Store.load(store_path, cache=True, recipient=RECIPIENT)
+    assert len(store.search("fancy", "")) == 1
+
+
+def test_corrupt_cache(store_path):
+    with open(_cache.cache_path(store_path), "wb") as fp:
+        fp.write(b"PWC1 garbage")
+    store = Store.load(store_path, cache=True, recipient=RECIPIENT)
+    assert list(store.entries) == Store.load(store_path).entries
+
+
+def test_corrupt_sections(tmp_path, dirname):
+    path = str(tmp_path / "db.pw")
+    shutil.copy(os.path.join(dirname, "db.pw"), path)
+    entries = Store.load(path, compact=True).entries
+    digest = _cache.source_digest(path)
+    data = bytearray(_cache.dump(entries, digest))
+
+    # the header is valid, but the users (the section before their ids) are not valid JSON
+    pos = len(data) - len(bytes(entries.values)) - len(entries.value_offsets.tobytes())
+    pos -= len(entries.users.ids.tobytes()) + 1
+    data[pos] = 0xFF
+    with pytest.raises(ValueError):
+        _cache.load(bytes(data), digest)
+    with open(_cache.cache_path(path), "wb") as fp:
+        fp.write(data)
+
+    # the cache is rebuilt
+    assert list(Store.load(path, cache=True).entries) == Store.load(path).entries
+    with open(_cache.cache_path(path), "rb") as fp:
+        assert list(_cache.load(fp.read(), digest)) == list(entries)
+
+
+def test_permissions(tmp_path, dirname):
+    path = str(tmp_path / "db.pw")
+    shutil.copy(os.path.join(dirname, "db.pw"), path)
+    os.chmod(path, 0o600)
+    with open(_cache.cache_path(path), "wb") as fp:
+        fp.write(b"stale")
+    os.chmod(_cache.cache_path(path), 0o644)
+    Store.load(path, cache=True)
+    assert stat.S_IMODE(os.stat(_cache.cache_path(path)).st_mode) == 0o600
+
+
+def test_encrypted_without_recipient(tmp_path, dirname):
+    path = str(tmp_path / "db.pw.asc")
+    shutil.copy(os.path.join(dirname, "db.pw.asc"), path)
+    store = Store.load(path, cache=True)
+    assert list(store.entries) == Store.load(path).entries
+    assert not os.path.exists(_cache.cache_path(path))
+
+
+def test_dump_load(dirname):
+    entries = Store.load(os.path.join(dirname, "db.pw"), compact=True).entries
+    data = _cache.dump(entries, b"x" * 32)
+    assert list(_cache.load(data, b"x" * 32)) == list(entries)
+    assert _cache.load(data, b"y" * 32) is None
+    assert _cache.load(data[:-1], b"x" * 32) is None
@@ -1,8 +1,8 @@
 # coding: utf-8
 from click.testing import CliRunner
-import os.path, sys, tempfile
+import json, os.path, re, shutil, sys, tempfile
 import pytest
-import pw, pw.__main__
+import pw, pw.__main__, pw._journal
 import pyperclip
 
 
@@ -10,7 +10,9 @@ import pyperclip
 def runner(request, dirname):
     runner = CliRunner()
     abspath = os.path.join(dirname, request.param)
-    return lambda *args: runner.invoke(pw.__main__.pw, ("--file", abspath) + args)
+    return lambda *args, **kwargs: runner.invoke(
+        pw.__main__.pw, ("--file", abspath) + args, **kwargs
+    )
 
 
 @pytest.fixture(scope="module", params=["db.pw.gpg", "db.pw.asc"])
@@ -74,6 +76,35 @@ laptop: bob
             2,
             "error: multiple or no records found (but using --strict flag)",
         ),
+        # exact keys
+        (["--exact", "laptop"], 0, "laptop: alice\n   default user\nlaptop: bob"),
+        (["--exact", "bob@laptop"], 0, "laptop: bob"),
+        (["--exact", "lapto"], 0, ""),
+        (["--exact", "--strict", "phones.myphone"], 0, "phones.myphone"),
+        (
+            ["--exact", "--strict", "phones"],
+            2,
+            "error: multiple or no records found (but using --strict flag)",
+        ),
+        # fuzzy matches and limits
+        (["--fuzzy", "pn"], 0, "phones.samson\nphones.myphone"),
+        (["--fuzzy", "--limit", "1", "pn"], 0, "phones.samson"),
+        (["--limit", "1", "phones"], 0, "phones.myphone"),
+        # regular expressions and wildcard patterns
+        (["--regex", "^p.*n$"], 0, "phones.samson"),
+        (["--regex", "o(g+)l", "^b"], 0, "goggles: bob+spam@gogglemail.com"),
+        (["--glob", "phones.*"], 0, "phones.myphone\nphones.samson"),
+        (["--glob", "*o*", "bob"], 0, "laptop: bob"),
+        (
+            ["--regex", "("],
+            1,
+            "error: invalid pattern (missing ), unterminated subpattern at position 0)",
+        ),
+        (
+            ["--regex", "--glob", "x"],
+            1,
+            "error: only one of --exact, --fuzzy, --regex and --glob can be given",
+        ),
     ],
 )
 def test_query(runner, args, exit_code, output_expected):
@@ -82,6 +113,122 @@ def test_query(runner, args, exit_code, output_expected):
     assert result.output.strip() == output_expected.strip()
 
 
+BATCH_INPUT = """
+laptop bob
+-S phones
+
+bob@goggle
+"unterminated
+myphone --strict
+nothing
+"""
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("", "goggles"),
+        ("gg", "go[gg]les"),
+        ("x", "goggles"),
+        (re.compile("g+"), "[g]o[gg]les"),
+        (re.compile("o|s$"), "g[o]ggle[s]"),
+        (re.compile("x*"), "goggles"),
+    ],
+)
+def test_highlight_match(monkeypatch, pattern, expected):
+    monkeypatch.setattr(pw.__main__, "style_match", lambda s: "[%s]" % s)
+    got = pw.__main__.highlight_match(pattern, "goggles")
+    assert got == expected
+
+
+def test_batch(runner):
+    result = runner("--batch", input=BATCH_INPUT)
+    assert result.exit_code == 2
+    assert result.stdout.split("\n") == ["b0b", "", "abcde", "", "0000", "", ""]
+    assert result.stderr.strip().splitlines() == [
+        "error: line 3: multiple or no records found",
+        "error: line 6: invalid query (No closing quotation)",
+    ]
+
+    result = runner("--batch", "--user", input="laptop bob\n--strict goggle bob\n")
+    assert result.exit_code == 0
+    assert result.stdout == "bob\nbob+spam@gogglemail.com\n"
+
+
+def test_batch_exact(runner):
+    result = runner(
+        "--batch", "--exact", input="laptop bob\nlapto bob\n-S phones.samson\n"
+    )
+    assert result.exit_code == 0
+    assert result.stdout.split("\n") == ["b0b", "", "111", ""]
+
+
+def test_batch_json(runner):
+    result = runner("--batch", "--json", input=BATCH_INPUT)
+    assert result.exit_code == 2
+    got = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(r["query"], r["code"]) for r in got] == [
+        ("laptop bob", 0),
+        ("-S phones", 2),
+        ("bob@goggle", 0),
+        ('"unterminated', 1),
+        ("myphone --strict", 0),
+        ("nothing", 0),
+    ]
+    assert got[0]["results"] == [
+        {"key": "laptop", "user": "bob", "password": "b0b", "notes": ""}
+    ]
+    assert [r["results"] for r in got[1:]] == [
+        [],
+        got[2]["results"],
+        [],
+        got[4]["results"],
+        [],
+    ]
+    assert "error" in got[1] and "error" in got[3] and "error" not in got[2]
+
+
+def test_timings(runner, monkeypatch, tmp_path):
+    result = runner("--raw", "--timings", "phones")
+    assert result.exit_code == 0
+    assert result.stdout == "0000\n111\n"
+    names = [line.split()[1] for line in result.stderr.splitlines()]
+    assert "load" in names and "parse" in names and "render" in names
+
+    path = str(tmp_path / "trace.json")
+    monkeypatch.setenv("PW_TRACE", path)
+    result = runner("--raw", "phones")
+    assert result.exit_code == 0
+    assert result.stderr == ""
+    with open(path) as fp:
+        events = json.load(fp)["traceEvents"]
+    assert {"load", "parse", "search", "render"} <= {e["name"] for e in events}
+
+
+def test_multiple_files(dirname):
+    runner = CliRunner()
+    paths = [os.path.join(dirname, "db.pw"), os.path.join(dirname, "db.pw.asc")]
+    args = ("-f", paths[0], "-f", paths[1], "--echo", "laptop", "bob")
+    result = runner.invoke(pw.__main__.pw, args)
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        "laptop: bob [%s] | b0b" % path for path in paths
+    ]
+
+    result = runner.invoke(pw.__main__.pw, args[:4] + ("--edit",))
+    assert result.exit_code == 1
+    assert result.output.strip() == "error: multiple password stores given"
+
+    result = runner.invoke(pw.__main__.pw, args[:2] + ("-f", "XXX"))
+    assert result.exit_code == 1
+    assert result.output.strip() == "error: password store not found at 'XXX'"
+
+
+def test_default_paths(monkeypatch):
+    monkeypatch.setenv("PW_PATH", os.pathsep.join(["a.pw", "", "b.pw.asc"]))
+    assert pw.__main__.default_paths() == ["a.pw", "b.pw.asc"]
+
+
 def test_missing():
     runner = CliRunner()
     result = runner.invoke(pw.__main__.pw, ("--file", "XXX"))
@@ -225,3 +372,84 @@ def test_edit_with_changes(dirname, filename, addendum):
         )
     finally:
         os.unlink(fp.name)
+
+
+@pytest.mark.parametrize("filename", ["db.pw", "db.pw.gpg", "db.pw.asc"])
+def test_set(dirname, tmp_path, monkeypatch, filename):
+    path = str(tmp_path / filename)
+    shutil.copy(os.path.join(dirname, filename), path)
+    monkeypatch.setenv("PW_GPG_RECIPIENT", "test.user@localhost")
+    runner = CliRunner()
+
+    def invoke(*args, **kwargs):
+        return runner.invoke(pw.__main__.pw, ("--file", path) + args, **kwargs)
+
+    result = invoke("--set", "bob@laptop", input="n3w\n")
+    assert result.exit_code == 0
+    result = invoke("--set", "new.entry", "carol", input="c4r0l\n")
+    assert result.exit_code == 0
+    assert result.output == ""
+    assert invoke("--raw", "laptop", "bob").output == "n3w\n"
+    assert invoke("--raw", "--exact", "new.entry").output == "c4r0l\n"
+    assert invoke("--raw", "--user", "new.entry").output == "carol\n"
+
+    # notes of existing entries are kept when compacting
+    result = invoke("--compact")
+    assert result.exit_code == 0
+    assert result.stderr == "folded 2 change(s) into '%s'\n" % path
+    assert not os.path.exists(pw._journal.journal_path(path))
+    store = pw.Store.load(path)
+    assert store.get("laptop") == [
+        pw.Entry("laptop", "alice", "4l1c3", "default user"),
+        pw.Entry("laptop", "bob", "n3w", ""),
+    ]
+    assert store.get("new.entry") == [pw.Entry("new.entry", "carol", "c4r0l", "")]
+
+
+def test_set_errors(dirname, tmp_path, monkeypatch):
+    path = str(tmp_path / "db.pw.gpg")
+    shutil.copy(os.path.join(dirname, "db.pw.gpg"), path)
+    monkeypatch.delenv("PW_GPG_RECIPIENT", raising=False)
+    runner = CliRunner()
+    result = runner.invoke(pw.__main__.pw, ("--file", path, "--set", "x"), input="y\n")
+    assert result.exit_code == 1
+    assert result.output.startswith("error: no recipient set")
+
+    monkeypatch.setenv("PW_GPG_RECIPIENT", "test.user@localhost")
+    result = runner.invoke(pw.__main__.pw, ("--file", path, "--set", "x"), input="\n")
+    assert result.exit_code == 1
+    assert result.stderr == "error: no password given\n"
+    result = runner.invoke(pw.__main__.pw, ("--file", path, "--set"), input="y\n")
+    assert result.exit_code == 1
+    assert result.stderr == "error: no key given\n"
+    result = runner.invoke(
+        pw.__main__.pw, ("--file", path, "--set", "x\ny"), input="y\n"
+    )
+    assert result.exit_code == 1
+    assert result.stderr == "error: key must not contain line breaks\n"
+    result = runner.invoke(
+        pw.__main__.pw, ("--file", path, "--set", "web:"), input="y\n"
+    )
+    assert result.exit_code == 1
+    assert result.stderr == "error: key must not end with ':'\n"
+    assert not os.path.exists(pw._journal.journal_path(path))
+
+
+def test_set_compacts(dirname, tmp_path, monkeypatch):
+    path = str(tmp_path / "db.pw")
+    shutil.copy(os.path.join(dirname, "db.pw"), path)
+    monkeypatch.setattr(pw._journal, "COMPACT_THRESHOLD", 2)
+    runner = CliRunner()
+    runner.invoke(pw.__main__.pw, ("--file", path, "--set", "a"), input="1\n")
+    assert len(pw._journal.record_paths(path)) == 1
+    runner.invoke(pw.__main__.pw, ("--file", path, "--set", "b"), input="2\n")
+    assert pw._journal.record_paths(path) == []
+    assert open(path).read().endswith("a: 1\nb: 2\n")
+
+    # editing folds changes into the file first
+    runner.invoke(pw.__main__.pw, ("--file", path, "--set", "c"), input="3\n")
+    monkeypatch.setenv("PW_EDITOR", "echo CALLED FOR")
+    result = runner.invoke(pw.__main__.pw, ("--file", path, "--edit"))
+    assert result.exit_code == 0
+    assert pw._journal.record_paths(path) == []
+    assert open(path).read().endswith("a: 1\nb: 2\nc: 3\n")
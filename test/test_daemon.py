@@ -0,0 +1,157 @@
+from click.testing import CliRunner
+import json, os, os.path, shutil, socket, stat, threading, time
+import pytest
+import pw, pw.__main__
+from pw import _daemon
+from pw.store import Entry, Store
+
+pytestmark = pytest.mark.skipif(
+    not _daemon.is_supported(), reason="requires Unix domain sockets"
+)
+
+
+@pytest.fixture
+def runtime_dir(tmp_path, monkeypatch):
+    path = tmp_path / "run"
+    path.mkdir()
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(path))
+    return path
+
+
+@pytest.fixture
+def store_path(tmp_path, dirname):
+    path = str(tmp_path / "db.pw")
+    shutil.copy(os.path.join(dirname, "db.pw"), path)
+    return path
+
+
+@pytest.fixture
+def server(runtime_dir, store_path):
+    server = _daemon.Server(Store.load(store_path), ttl=10)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    yield server
+    server.running = False
+    _daemon.search(store_path, "", "")  # wake up server
+    thread.join()
+
+
+def test_search(server, store_path):
+    store = Store.load(store_path)
+    for key_pattern, user_pattern in [("", ""), ("oggle", ""), ("", "bob")]:
+        got = _daemon.search(store_path, key_pattern, user_pattern)
+        assert got == store.search(key_pattern, user_pattern)
+
+
+def test_socket_permissions(server, store_path):
+    path = _daemon.socket_path(store_path)
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_no_daemon(runtime_dir, store_path):
+    assert _daemon.search(store_path, "", "") is None
+
+
+def test_insecure_socket_dir(runtime_dir, store_path):
+    dirname = os.path.dirname(_daemon.socket_path(store_path))
+    os.makedirs(dirname, mode=0o755)
+    os.chmod(dirname, 0o755)
+    with pytest.raises(PermissionError):
+        _daemon.Server(Store.load(store_path))
+
+
+def test_already_running(server, store_path):
+    with pytest.raises(RuntimeError):
+        _daemon.Server(Store.load(store_path))
+
+
+def test_idle_timeout(runtime_dir, store_path):
+    server = _daemon.Server(Store.load(store_path), ttl=0.1)
+    start = time.time()
+    server.serve()
+    assert time.time() - start < 5
+    assert not os.path.exists(_daemon.socket_path(store_path))
+    assert _daemon.search(store_path, "", "") is None
+
+
+def test_stale_store(runtime_dir, store_path):
+    server = _daemon.Server(Store.load(store_path), ttl=10)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    with open(store_path, "a") as fp:
+        fp.write("fancy_new_entry: user pass\n")
+    assert _daemon.search(store_path, "fancy", "") is None
+    thread.join()
+    assert not os.path.exists(_daemon.socket_path(store_path))
+
+
+def test_stale_journal(runtime_dir, store_path):
+    server = _daemon.Server(Store.load(store_path), ttl=10)
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    Store.load(store_path).add("fancy_new_entry", "user", "pass")
+    assert _daemon.search(store_path, "fancy", "") is None
+    thread.join()
+    assert not os.path.exists(_daemon.socket_path(store_path))
+
+
+def test_restart(runtime_dir, store_path):
+    # a new daemon replaces one serving a changed store, which must leave the new socket in place
+    old_server = _daemon.Server(Store.load(store_path), ttl=10)
+    old_thread = threading.Thread(target=old_server.serve)
+    old_thread.start()
+    with open(store_path, "a") as fp:
+        fp.write("fancy_new_entry: user pass\n")
+    server = _daemon.Server(Store.load(store_path), ttl=10)
+    old_thread.join()
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    try:
+        assert os.path.exists(_daemon.socket_path(store_path))
+        assert _daemon.search(store_path, "fancy", "") == [
+            Entry("fancy_new_entry", "user", "pass", "")
+        ]
+    finally:
+        server.running = False
+        _daemon.search(store_path, "", "")  # wake up server
+        thread.join()
+    assert not os.path.exists(_daemon.socket_path(store_path))
+
+
+def test_silent_client(server, store_path, monkeypatch):
+    monkeypatch.setattr(_daemon._Handler, "timeout", 0.1)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(_daemon.socket_path(store_path))
+        start = time.time()
+        assert _daemon.search(store_path, "laptop", "") is not None
+        assert time.time() - start < _daemon._CLIENT_TIMEOUT / 2
+        assert b"invalid request" in sock.recv(1024)
+
+
+def test_invalid(server, store_path):
+    path = os.path.abspath(store_path)
+    for request in [
+        b"\xff",
+        b"[]",
+        json.dumps({"path": 1}).encode(),
+        json.dumps({"path": path, "key_pattern": 1, "user_pattern": ""}).encode(),
+    ]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(_daemon.socket_path(store_path))
+            sock.sendall(request + b"\n")
+            with sock.makefile("rb") as fp:
+                response = json.loads(fp.readline())
+        assert response["error"].startswith("invalid request")
+    assert _daemon.search(store_path, "laptop", "") is not None
+
+
+def test_cli(server, store_path):
+    # the CLI is served by the daemon's (here: modified) copy of the store
+    server.store = Store(store_path, [Entry("laptop", "bob", "from daemon", "")])
+    runner = CliRunner()
+    result = runner.invoke(
+        pw.__main__.pw, ("--file", store_path, "--echo", "laptop", "bob")
+    )
+    assert result.exit_code == 0
+    assert result.output.strip() == "laptop: bob | from daemon"
@@ -0,0 +1,80 @@
+import os.path, subprocess, sys
+import pytest
+import pw, pw._fast
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        (["-R", "laptop"], ({"raw"}, [], ["laptop"])),
+        (
+            ["-RSU", "-f", "a.pw", "bob@laptop"],
+            ({"raw", "strict", "user"}, ["a.pw"], ["bob@laptop"]),
+        ),
+        (
+            ["--raw", "--exact", "--file=a.pw", "-f", "b.pw", "laptop", "bob"],
+            ({"raw", "exact"}, ["a.pw", "b.pw"], ["laptop", "bob"]),
+        ),
+        (["-RP", "-"], ({"raw", "prefix"}, [], ["-"])),
+        # anything else is left to the full command line interface
+        (["laptop"], None),
+        (["-E", "laptop"], None),
+        (["-R", "a", "b", "c"], None),
+        (["-R", "--fuzzy", "laptop"], None),
+        (["-RF", "laptop"], None),
+        (["-R", "-f"], None),
+        (["-R", "--version"], None),
+    ],
+)
+def test_parse_args(args, expected):
+    assert pw._fast._parse_args(args) == expected
+
+
+@pytest.mark.parametrize(
+    "args, exit_code, expected",
+    [
+        (["-R", "laptop"], 0, "4l1c3\nb0b\n"),
+        (["-RS", "bob@laptop"], 0, "b0b\n"),
+        (["-RSU", "myphone"], 0, "\n"),
+        (["-RX", "phones"], 0, ""),
+        (["-RP", "phones"], 0, "0000\n111\n"),
+        (["-R", "-S", "phones"], 2, ""),
+        # falls back to the full command line interface
+        (["-E", "-S", "myphone"], 0, "phones.myphone | 0000\n"),
+        (["-R", "-f", "XXX", "laptop"], 1, ""),
+    ],
+)
+def test_main(monkeypatch, capsys, dirname, args, exit_code, expected):
+    monkeypatch.setenv("PW_PATH", os.path.join(dirname, "db.pw"))
+    monkeypatch.setattr(sys, "argv", ["pw"] + args)
+    try:
+        pw._fast.main()
+        got_exit_code = 0
+    except SystemExit as e:
+        got_exit_code = e.code or 0
+    assert got_exit_code == exit_code
+    assert capsys.readouterr().out == expected
+
+
+def test_import_time(dirname):
+    # searches in raw mode must not import click, the clipboard, or multiprocessing
+    code = "import sys; sys.argv = ['pw', '-RS', 'myphone']; from pw._fast import main; main()"
+    env = dict(os.environ, PW_PATH=os.path.join(dirname, "db.pw"))
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(pw.__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    assert result.stdout == "0000\n"
+    imported = {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    assert "pw.store" in imported
+    for module in ["click", "colorama", "pyperclip", "multiprocessing", "pw.__main__"]:
+        assert module not in imported
@@ -1,7 +1,16 @@
-import os.path, tempfile
+import os.path, subprocess, tempfile
 import pytest
 import pw._gpg
-from pw._gpg import is_encrypted, has_armor, unencrypted_ext, decrypt, encrypt
+from pw._gpg import (
+    is_encrypted,
+    has_armor,
+    unencrypted_ext,
+    decrypt,
+    decrypt_stream,
+    decrypt_bytes,
+    encrypt,
+    encrypt_bytes,
+)
 
 
 def test_detection():
@@ -36,6 +45,20 @@ def test_decrypt(dirname, filename):
     assert decrypted == unencrypted
 
 
+@pytest.mark.parametrize("filename", ["db.pw.asc", "db.pw.gpg"])
+def test_decrypt_stream(dirname, filename):
+    with decrypt_stream(os.path.join(dirname, filename)) as stream:
+        decrypted = stream.read()
+    unencrypted = open(os.path.join(dirname, "db.pw"), "rb").read()
+    assert decrypted == unencrypted
+
+
+def test_decrypt_stream_failure(dirname):
+    with pytest.raises(subprocess.CalledProcessError):
+        with decrypt_stream(os.path.join(dirname, "XXX.pw.gpg")) as stream:
+            stream.read()
+
+
 @pytest.mark.parametrize("filename", ["db.pw.asc", "db.pw.gpg"])
 def test_encrypt(dirname, filename):
     # load unencrypted password file
@@ -51,3 +74,9 @@ def test_encrypt(dirname, filename):
         assert decrypted == unencrypted
     finally:
         os.unlink(fp.name)
+
+
+def test_encrypt_bytes():
+    encrypted = encrypt_bytes("test.user@localhost", b"secret")
+    assert b"secret" not in encrypted
+    assert decrypt_bytes(encrypted) == b"secret"
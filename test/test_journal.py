@@ -0,0 +1,233 @@
+import os, os.path, shutil, stat
+import pytest
+from pw import _journal
+from pw.store import Entry, Store, _format_entries, _load_source, _parse_entries
+
+RECIPIENT = "test.user@localhost"
+
+
+@pytest.fixture(params=["db.pw", "db.pw.gpg"])
+def store_path(request, tmp_path, dirname):
+    path = str(tmp_path / request.param)
+    shutil.copy(os.path.join(dirname, request.param), path)
+    return path
+
+
+@pytest.fixture
+def umask():
+    # a permissive umask, under which files containing passwords must still be private
+    old_umask = os.umask(0o022)
+    yield
+    os.umask(old_umask)
+
+
+def _changes(store):
+    store.add(
+        "New Key",
+        "carol",
+        "c4r0l",
+        notes="first line\nsecond line",
+        recipient=RECIPIENT,
+    )
+    store.update("laptop", "bob", password="b0b2", recipient=RECIPIENT)
+    store.update("router", "ädmin", notes="", recipient=RECIPIENT)
+    store.remove("phones.samson", "", recipient=RECIPIENT)
+
+
+def test_write(store_path):
+    store = Store.load(store_path)
+    original = list(store.entries)
+    _changes(store)
+    assert len(_journal.record_paths(store_path)) == 4
+
+    # changes take effect immediately, and whenever the file is loaded
+    expected = sorted(
+        [e for e in original if e.key != "phones.samson"]
+        + [Entry("new_key", "carol", "c4r0l", "first line\nsecond line")],
+        key=lambda e: e.key,
+    )
+    expected = [
+        e._replace(password="b0b2") if e.user == "bob" and e.key == "laptop" else e
+        for e in expected
+    ]
+    expected = [e._replace(notes="") if e.key == "router" else e for e in expected]
+    assert list(store.entries) == expected
+    assert store.get("new key") == [e for e in expected if e.key == "new_key"]
+    assert store.search("samson", "") == []
+    assert list(Store.load(store_path).entries) == expected
+    assert list(Store.load(store_path, compact=True).entries) == expected
+    assert list(Store.load(store_path, lazy=True).entries) == expected
+    assert sorted(Store.iter_load(store_path), key=lambda e: e.key) == expected
+
+    # the password file itself is unchanged until the journal is compacted
+    assert _parse_entries(_load_source(store_path)) != expected
+    assert _journal.compact(store_path, RECIPIENT) == 4
+    assert not os.path.exists(_journal.journal_path(store_path))
+    assert list(Store.load(store_path).entries) == expected
+    assert _journal.compact(store_path, RECIPIENT) == 0
+
+
+def test_write_errors(store_path):
+    store = Store.load(store_path)
+    with pytest.raises(ValueError):
+        store.add("laptop", "bob", "b0b", recipient=RECIPIENT)
+    with pytest.raises(ValueError):
+        store.add("laptop", "carol", "", recipient=RECIPIENT)
+    with pytest.raises(KeyError):
+        store.update("laptop", "carol", password="c4r0l", recipient=RECIPIENT)
+    with pytest.raises(KeyError):
+        store.remove("laptop", "carol", recipient=RECIPIENT)
+    assert _journal.record_paths(store_path) == []
+
+    # journals are only kept for password files
+    with pytest.raises(ValueError):
+        Store("a.pw:b.pw", store.entries).add("x", "y", "z")
+
+
+@pytest.mark.parametrize(
+    "key, user, password, notes",
+    [
+        ("a\nb", "u", "p", ""),
+        ("web:", "u", "p", ""),
+        (":", "u", "p", ""),
+        ("k", "a\rb", "p", ""),
+        ("k", "u", "two\nlines", ""),
+        ("k", "u", "p", "a\n\nb"),
+        ("k", "u", "p", "a\n  b"),
+        ("k", "u", "p", "a \nb"),
+        ("k", "u", "p", "a\n"),
+        ("k", "u", "p", "a\r\nb"),
+    ],
+)
+def test_write_unformattable(tmp_path, key, user, password, notes):
+    path = str(tmp_path / "db.pw")
+    with open(path, "w") as fp:
+        fp.write("k: u p\n")
+    store = Store.load(path, incremental=True)
+    with pytest.raises(ValueError):
+        store.add(key, user, password, notes=notes)
+    with pytest.raises(ValueError):
+        store.update(key, user, password=password, notes=notes)
+    assert _journal.record_paths(path) == []
+    with pytest.raises(ValueError):
+        _format_entries([Entry(key, user, password, notes)])
+
+
+def test_write_incremental(tmp_path):
+    path = str(tmp_path / "db.pw")
+    with open(path, "w") as fp:
+        fp.write("a: alice 1\nb: bob 2\n")
+    store = Store.load(path, incremental=True)
+    store.update("a", "alice", password="one", notes="first\nsecond")
+    with open(path, "a") as fp:
+        fp.write("c: carol 3\n")
+    assert [e.password for e in store.reload().entries] == ["one", "2", "3"]
+
+    _journal.compact(path)
+    assert list(Store.load(path).entries) == list(store.reload().entries)
+
+
+@pytest.mark.parametrize("mode", [0o600, 0o640])
+def test_permissions(tmp_path, umask, mode):
+    path = str(tmp_path / "db.pw")
+    with open(path, "w") as fp:
+        fp.write("a: alice 1\n")
+    os.chmod(path, mode)
+    store = Store.load(path)
+    store.add("b", "bob", "2")
+    assert stat.S_IMODE(os.stat(_journal.journal_path(path)).st_mode) == 0o700
+    (record_path,) = _journal.record_paths(path)
+    assert stat.S_IMODE(os.stat(record_path).st_mode) == 0o600
+
+    # compaction keeps the permissions of the password file
+    _journal.compact(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == mode
+    assert os.listdir(str(tmp_path)) == ["db.pw"]
+
+
+def test_write_encrypted_without_recipient(tmp_path, dirname):
+    path = str(tmp_path / "db.pw.asc")
+    shutil.copy(os.path.join(dirname, "db.pw.asc"), path)
+    store = Store.load(path)
+    with pytest.raises(ValueError):
+        store.add("x", "y", "z")
+
+
+def test_compact_source(tmp_path):
+    path = str(tmp_path / "db.pw")
+    with open(path, "w") as fp:
+        fp.write(
+            "# comment\n"
+            "a: alice 1 notes\n"
+            "  more notes\n"
+            "\n"
+            "b: bob 2\n"
+            "c: carol 3"
+        )
+    store = Store.load(path)
+    store.update("a", "alice", password="one two")
+    store.remove("b", "bob")
+    store.add("d", "dave", "4")
+    store.remove("c", "carol")
+    store.add("c", "carol", "three")
+    _journal.compact(path)
+    with open(path) as fp:
+        assert fp.read() == (
+            "# comment\n"
+            "a: alice 'one two'\n"
+            "  notes\n"
+            "  more notes\n"
+            "\n"
+            "c: carol three\n"
+            "d: dave 4\n"
+        )
+
+
+@pytest.mark.parametrize(
+    "records, expected",
+    [
+        ([{"op": "remove", "key": "A", "user": "u"}], {("a", "u"): None}),
+        (
+            [
+                {"op": "remove", "key": "a", "user": "u"},
+                {"op": "update", "key": "a", "user": "u", "password": "p"},
+            ],
+            {("a", "u"): None},
+        ),
+        (
+            [
+                {"op": "update", "key": "a", "user": "u", "notes": "n"},
+                {"op": "set", "key": "A", "user": "u", "password": "p"},
+            ],
+            {("a", "u"): {"key": "A", "password": "p", "notes": "n"}},
+        ),
+        (
+            [
+                {"op": "set", "key": "a", "user": "", "password": "p"},
+                {"op": "add", "key": "a", "user": "", "password": "q", "notes": ""},
+            ],
+            {("a", ""): {"key": "a", "password": "q", "notes": ""}},
+        ),
+    ],
+)
+def test_fold(records, expected):
+    assert _journal.fold(records) == expected
+
+
+def test_apply_idempotent():
+    entries = [Entry("a", "u", "1", ""), Entry("b", "", "2", "n")]
+    changes = _journal.fold(
+        [
+            {"op": "set", "key": "b", "user": "", "password": "3"},
+            {"op": "set", "key": "c", "user": "", "password": "4"},
+            {"op": "remove", "key": "a", "user": "u"},
+        ]
+    )
+    once = list(_journal.apply(entries, changes))
+    assert once == [Entry("b", "", "3", "n"), Entry("c", "", "4", "")]
+    assert list(_journal.apply(once, changes)) == once
+
+
+def test_invalid_record():
+    with pytest.raises(ValueError):
+        _journal.fold([{"op": "rename", "key": "a", "user": ""}])
@@ -0,0 +1,93 @@
+from click.testing import CliRunner
+import os, os.path
+import pytest
+import pw.__main__
+from pw import _gpg, _pwx
+from pw.store import Entry, Store, _iter_load
+
+RECIPIENT = "test.user@localhost"
+
+
+@pytest.fixture(scope="module")
+def pwx_path(tmp_path_factory, dirname):
+    path = str(tmp_path_factory.mktemp("pwx") / "db.pwx")
+    _pwx.write(path, Store.iter_load(os.path.join(dirname, "db.pw")), RECIPIENT)
+    return path
+
+
+def test_load(pwx_path, dirname):
+    store = Store.load(pwx_path)
+    assert list(store.entries) == Store.load(os.path.join(dirname, "db.pw")).entries
+
+
+def test_search_decrypts_only_results(pwx_path, monkeypatch):
+    store = Store.load(pwx_path)
+    decrypted = []
+    original_decrypt_bytes = _gpg.decrypt_bytes
+
+    def decrypt_bytes(content):
+        decrypted.append(content)
+        return original_decrypt_bytes(content)
+
+    monkeypatch.setattr(_gpg, "decrypt_bytes", decrypt_bytes)
+    results = store.search("phones", "")
+    assert [e.password for e in results] == ["0000", "111"]
+    assert len(decrypted) == 2
+
+
+def test_load_many_decrypts_only_results(pwx_path, dirname, monkeypatch):
+    path = os.path.join(dirname, "db.pw")
+    store = Store.load_many([path, pwx_path])
+    decrypted = []
+    original_decrypt_bytes = _gpg.decrypt_bytes
+
+    def decrypt_bytes(content):
+        decrypted.append(content)
+        return original_decrypt_bytes(content)
+
+    monkeypatch.setattr(_gpg, "decrypt_bytes", decrypt_bytes)
+    results = store.search("phones", "")
+    assert [(e.password, e.source) for e in results] == [
+        ("0000", path),
+        ("0000", pwx_path),
+        ("111", path),
+        ("111", pwx_path),
+    ]
+    assert len(decrypted) == 2
+
+
+def test_original_keys(tmp_path):
+    path = str(tmp_path / "db.pwx")
+    entries = [Entry("b", "", "x", "n"), Entry("My Bank", "alice", "s3cret", "")]
+    _pwx.write(path, entries, RECIPIENT)
+    assert list(_iter_load(path)) == entries
+    assert Store.load(path).get("my bank")[0].key == "my_bank"
+
+
+def test_invalid(tmp_path):
+    path = str(tmp_path / "db.pwx")
+    with open(path, "wb") as fp:
+        fp.write(b"laptop: bob b0b\n")
+    with pytest.raises(ValueError):
+        Store.load(path)
+
+
+def test_cli(pwx_path, tmp_path, dirname, monkeypatch):
+    monkeypatch.setenv("PW_GPG_RECIPIENT", RECIPIENT)
+    runner = CliRunner()
+    result = runner.invoke(
+        pw.__main__.pw, ("--file", pwx_path, "--raw", "laptop", "bob")
+    )
+    assert result.exit_code == 0
+    assert result.output == "b0b\n"
+
+    # convert to text and back
+    for src, dest in [(pwx_path, "db.pw.gpg"), ("db.pw.gpg", "db2.pwx")]:
+        src = os.path.join(str(tmp_path), src)
+        dest = os.path.join(str(tmp_path), dest)
+        result = runner.invoke(pw.__main__.pw, ("--file", src, "--convert", dest))
+        assert result.exit_code == 0
+        assert list(Store.load(dest).entries) == list(Store.load(pwx_path).entries)
+
+    result = runner.invoke(pw.__main__.pw, ("--file", pwx_path, "--edit"))
+    assert result.exit_code == 1
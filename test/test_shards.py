@@ -0,0 +1,116 @@
+from click.testing import CliRunner
+import os, os.path
+import pytest
+import pw.__main__
+from pw import _shards
+from pw.store import _format_entries, _parse_entries, Entry, Store
+
+ENTRIES = [
+    Entry("phones.myphone", "", "0000", ""),
+    Entry("Phones.Samson", "", "111", ""),
+    Entry("phones", "alice", "p", "notes"),
+    Entry("laptop", "alice", "4l1c3", "default user"),
+    Entry("laptop", "bob", "b0b", ""),
+    Entry("router", "ädmin", "gamma zeta", "multiple\nlines"),
+    Entry("rover", "it's me", '"quoted" #password', ""),
+]
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    dirname = str(tmp_path / "db")
+    _shards.write(dirname, ENTRIES, shard_size=2)
+    return dirname
+
+
+def test_split():
+    keys = sorted(["a", "a", "ab", "abc", "abd", "b", "ba", "c"])
+    groups = list(_shards._split(keys, "", 0, len(keys), 2))
+    assert [start for _, start, _ in groups] == [0, 2, 3, 4, 5, 7]
+    for prefix, start, end in groups:
+        assert 0 < end - start <= 2
+        assert all(key.startswith(prefix) for key in keys[start:end])
+
+
+def test_format_entries():
+    assert _parse_entries(_format_entries(ENTRIES)) == ENTRIES
+
+
+def test_write(sharded):
+    filenames = sorted(os.listdir(sharded))
+    assert filenames[0] == "manifest.pw"
+    assert len(filenames) > 3
+
+    # rewriting the store writes shards of a new generation, and then removes the previous ones
+    _shards.write(sharded, ENTRIES[:1], shard_size=2)
+    assert sorted(os.listdir(sharded)) == ["manifest.pw", "shard-2-0000.pw"]
+    assert Store.load(sharded).entries == Store("", ENTRIES[:1]).entries
+
+
+def test_write_keeps_previous_shards(sharded, monkeypatch):
+    # until the manifest is replaced, it refers to the shards of the previous version
+    expected = Store.load(sharded).entries
+    write_file = _shards._write_file
+
+    def write_shards_only(path, content, recipient):
+        if os.path.basename(path) == _shards.MANIFEST_NAME:
+            assert Store.load(sharded).entries == expected
+            raise KeyboardInterrupt()
+        write_file(path, content, recipient)
+
+    monkeypatch.setattr(_shards, "_write_file", write_shards_only)
+    with pytest.raises(KeyboardInterrupt):
+        _shards.write(sharded, ENTRIES[:3], shard_size=1)
+    assert Store.load(sharded).entries == expected
+
+
+def test_load(sharded):
+    expected = Store("", ENTRIES).entries
+    assert Store.load(sharded).entries == expected
+    assert list(Store.load(sharded, lazy=True).entries) == expected
+    assert list(Store.iter_load(sharded)) == expected
+
+
+@pytest.mark.parametrize("key_prefix", ["", "p", "PHONES", "phones.s", "ro", "x"])
+def test_load_key_prefix(sharded, key_prefix):
+    expected = [
+        e for e in Store("", ENTRIES).entries if e.key.startswith(key_prefix.lower())
+    ]
+    store = Store.load(sharded, key_prefix=key_prefix)
+    assert [
+        e for e in store.entries if e.key.startswith(key_prefix.lower())
+    ] == expected
+
+    # only the necessary shards are loaded
+    paths = _shards.shard_paths(sharded, key_prefix.lower())
+    assert len(paths) <= len(_shards.shard_paths(sharded))
+    if key_prefix:
+        assert len(paths) < len(_shards.shard_paths(sharded))
+
+
+def test_write_encrypted(tmp_path):
+    dirname = str(tmp_path / "db")
+    _shards.write(
+        dirname, ENTRIES, ext=".gpg", recipient="test.user@localhost", shard_size=2
+    )
+    assert os.path.exists(os.path.join(dirname, "manifest.pw.gpg"))
+    assert Store.load(dirname).entries == Store("", ENTRIES).entries
+
+
+def test_cli(tmp_path, dirname):
+    dest = str(tmp_path / "db")
+    runner = CliRunner()
+    result = runner.invoke(
+        pw.__main__.pw, ("--file", os.path.join(dirname, "db.pw"), "--reshard", dest)
+    )
+    assert result.exit_code == 0
+    result = runner.invoke(
+        pw.__main__.pw, ("--file", dest, "--echo", "--prefix", "phones")
+    )
+    assert result.exit_code == 0
+    assert result.output.strip() == "phones.myphone | 0000\nphones.samson | 111"
+    result = runner.invoke(
+        pw.__main__.pw, ("--file", dest, "--echo", "--prefix", "myphone")
+    )
+    assert result.exit_code == 0
+    assert result.output.strip() == ""
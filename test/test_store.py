@@ -1,8 +1,24 @@
 # coding: utf-8
 import pytest
-import os.path
+import fnmatch, io, os, os.path, re, shutil, time
 import pw
-from pw.store import _normalized_key, _parse_entries, Entry, Store, SyntaxError
+from pw.store import (
+    _fuzzy_score,
+    _normalized_key,
+    _parse_entries,
+    _parse_entries_parallel,
+    _iter_entries,
+    _iter_lines,
+    _iter_lazy_records,
+    Entry,
+    ReloadingStore,
+    SearchSession,
+    Store,
+    SyntaxError,
+    _regex_literals,
+    _split_blocks,
+    _SCORE_SCALE,
+)
 
 
 def test_normalized_key():
@@ -162,6 +178,22 @@ key "" pass notes line 0
         ),
         (
             """
+key pass
+    notes line 1
+key user pass
+    notes line 1
+key user pass notes line 0
+key user pass
+        """,
+            [
+                Entry(key="key", user="", password="pass", notes="notes line 1"),
+                Entry(key="key", user="user", password="pass", notes="notes line 1"),
+                Entry(key="key", user="user", password="pass", notes="notes line 0"),
+                Entry(key="key", user="user", password="pass", notes=""),
+            ],
+        ),
+        (
+            """
 key user pass
     notes line 1
     notes line 2
@@ -246,6 +278,62 @@ def test_parse_entries(src, expected):
     assert entries == expected
 
 
+def test_parse_entries_long_notes():
+    notes = ["line %d" % i for i in range(20000)]
+    src = "key user pass first\n" + "".join("  %s\n" % line for line in notes) + "k p\n"
+    assert _parse_entries(src) == [
+        Entry("key", "user", "pass", "\n".join(["first"] + notes)),
+        Entry("k", "", "p", ""),
+    ]
+
+
+def _lazy_entries(src):
+    from pw._compact import LazyEntries
+
+    return LazyEntries(src, _iter_lazy_records(src))
+
+
+@pytest.mark.parametrize(
+    "src",
+    [
+        "key pass",
+        "key: user pass notes\n  more\n\tnotes\nb: pass\n  b notes",
+        'Key "user name" "pass word" notes\r\n  more notes\r\n# comment\r\n\na: "x y"',
+        "b pass\n  notes\x0bA pass\u2028  notes\r\n\n#\n",
+        "b: user pass\nb: pass #comment\n  notes\nb: user pass#comment notes\n  notes",
+    ],
+)
+def test_parse_entries_lazy(src):
+    expected = sorted(Store("", _parse_entries(src)).entries, key=lambda e: e.key)
+    assert list(_lazy_entries(src)) == expected
+
+
+@pytest.mark.parametrize(
+    "src",
+    [
+        "key: user pass notes\n  more\n\tnotes\nb: pass\n  b notes\n",
+        'ä: "ü ser" pass\n  nötes\n\u3000\nc pass\n\xa0\n',
+        'Key "user name" "pass word" notes\r\n  more notes\r\n# comment\r\n\na: "x y"',
+        "b pass\n  notes\x0bA pass\u2028  notes\r\n\n#\n",
+        "",
+    ],
+)
+@pytest.mark.parametrize("block_size", [1, 7, 1 << 20])
+def test_store_load_mapped(tmp_path, monkeypatch, src, block_size):
+    from pw._compact import MappedEntries
+
+    monkeypatch.setattr(pw.store, "_MAPPED_BLOCK_SIZE", block_size)
+    path = str(tmp_path / "db.pw")
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        fp.write(src)
+    store = Store.load(path, lazy=True)
+    assert list(store.entries) == Store("", _parse_entries(src)).entries
+
+    # unless there are line breaks other than newlines, the source is memory-mapped
+    mapped = src and not any(c in src for c in "\r\x0b\u2028")
+    assert isinstance(store.entries, MappedEntries) == bool(mapped)
+
+
 @pytest.mark.parametrize(
     "src, expected_error_prefix",
     [
@@ -300,6 +388,63 @@ def test_parse_entries_syntax_errors(src, expected_error_prefix):
         _parse_entries(src.strip())
     assert str(excinfo.value).startswith(expected_error_prefix)
 
+    with pytest.raises(SyntaxError) as excinfo:
+        list(_iter_lazy_records(src.strip()))
+    assert str(excinfo.value).startswith(expected_error_prefix)
+
+
+PARALLEL_SRC = """
+# comment
+key user pass notes
+  more notes
+\tand more
+
+key2: "quoted user" 'quoted pass'
+key3 pass\r\n  crlf notes\r\n\r
+key4 user pass\x0b  notes after vertical tab
+# comment followed by entry
+key5 user pass
+  last notes"""
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 20, 1000])
+def test_parse_entries_parallel(chunk_size):
+    src = PARALLEL_SRC * 3
+    got = _parse_entries_parallel(src, chunk_size=chunk_size, max_workers=2)
+    assert got == _parse_entries(src)
+
+
+@pytest.mark.parametrize(
+    "src, expected_error_prefix",
+    [
+        (
+            PARALLEL_SRC * 3 + "\n\n  notes after blank line\n",
+            "line 45: expecting entry (",
+        ),
+        (
+            PARALLEL_SRC + '\nfoo: "bar\n' + PARALLEL_SRC,
+            "line 16: No closing quotation (",
+        ),
+        (PARALLEL_SRC + "\n\nfoo\n", "line 17: expecting entry ("),
+        (PARALLEL_SRC + "\nfoo\n", "line 16: expecting entry or notes ("),
+    ],
+    ids=["notes", "quotation", "entry", "entry_or_notes"],
+)
+def test_parse_entries_parallel_syntax_errors(src, expected_error_prefix):
+    with pytest.raises(SyntaxError) as excinfo:
+        _parse_entries(src)
+    assert str(excinfo.value).startswith(expected_error_prefix)
+
+    with pytest.raises(SyntaxError) as excinfo:
+        _parse_entries_parallel(src, chunk_size=1, max_workers=2)
+    assert str(excinfo.value).startswith(expected_error_prefix)
+
+
+def test_store_load_parallel(dirname, monkeypatch):
+    monkeypatch.setattr(pw.store, "_parse_in_parallel", lambda path: True)
+    path = os.path.join(dirname, "db.pw")
+    assert Store.load(path).entries == Store(path, Store.iter_load(path)).entries
+
 
 @pytest.fixture(scope="module", params=["db.pw", "db.pw.gpg", "db.pw.asc"])
 def store(request, dirname):
@@ -323,10 +468,372 @@ def test_store_entries(store):
         Entry("phones.samson", "", "111", ""),
     ]  # yapf: disable
     expected = sorted(expected, key=lambda e: e.key)
-    got = sorted(store.entries, key=lambda e: e.key)
+    assert list(store.entries) == expected
+
+
+def test_store_iter_search(store):
+    results = store.iter_search(key_pattern="", user_pattern="")
+    assert next(results) == store.entries[0]
+    assert list(results) == list(store.entries[1:])
+
+
+@pytest.mark.parametrize("filename", ["db.pw", "db.pw.gpg", "db.pw.asc"])
+def test_store_iter_load(dirname, filename):
+    entries = Store.iter_load(os.path.join(dirname, filename))
+    assert next(entries) == Entry("laptop", "alice", "4l1c3", "default user")
+    expected = _parse_entries(open(os.path.join(dirname, "db.pw")).read())
+    assert list(entries) == expected[1:]
+
+
+@pytest.mark.parametrize(
+    "src",
+    [
+        "",
+        "\n",
+        "a",
+        "a\nb\n",
+        "a\r\nb\rc\n\nd",
+        "a\x0bb\x0cc\x1cd\x1de\x1ef\x85g\u2028h\u2029i",
+        "\r\n\r\r\n\n",
+    ],
+)
+def test_iter_lines(src):
+    stream = io.BytesIO(src.encode("utf-8"))
+    assert list(_iter_lines(stream)) == src.splitlines()
+
+
+def test_store_load_many(dirname):
+    paths = [os.path.join(dirname, "db.pw"), os.path.join(dirname, "db.pw.gpg")]
+    store = Store.load_many(paths)
+    single = Store.load(paths[0])
+    assert len(store.entries) == 2 * len(single.entries)
+
+    # entries compare equal to plain entries, and entries with equal keys remain in order of the stores
+    for path in paths:
+        assert [e for e in store.entries if e.source == path] == single.entries
+    assert [e.source for e in store.search("", "bob")] == paths * 2
+
+
+def test_store_search_many(store):
+    queries = [("oggle", ""), ("", "bob"), ("OGGLE", ""), ("", "bob"), ("xxx", "")]
+    got = store.search_many(queries)
+    assert got == [store.search(*query) for query in queries]
+
+
+@pytest.mark.parametrize("options", [dict(), dict(compact=True), dict(lazy=True)])
+def test_store_get(store, options):
+    store = Store.load(store.path, **options)
+    assert [e.user for e in store.get("laptop")] == ["alice", "bob"]
+    assert [e.user for e in store.get("LapTop", "bob")] == ["bob"]
+    assert store.get("laptop", "") == []
+    assert store.get("phones.myphone", "") == [Entry("phones.myphone", "", "0000", "")]
+    assert store.get("lapto") == store.get("phones") == store.get("zzz") == []
+
+
+@pytest.mark.parametrize(
+    "pattern, string, expected",
+    [
+        ("", "abc", 0),
+        ("ab", "abc", 3 * _SCORE_SCALE - 3),
+        ("bank", "mail.bank", 2 * _SCORE_SCALE - 9),
+        ("ank", "mail.bank", 1 * _SCORE_SCALE - 9),
+        ("mb", "mail.bank", -9),
+        ("bm", "mail.bank", None),
+    ],
+)
+def test_fuzzy_score(pattern, string, expected):
+    assert _fuzzy_score(pattern, string) == expected
+
+
+def test_store_search_ranked(store):
+    def ranked(*args, **kwargs):
+        return [(e.key, e.user) for e in store.search_ranked(*args, **kwargs)]
+
+    # prefix matches first, then matches at word boundaries, then substrings, then subsequences
+    assert ranked("phones", "") == [("phones.samson", ""), ("phones.myphone", "")]
+    assert ranked("myph", "") == [("phones.myphone", "")]
+    assert ranked("pn", "") == [("phones.samson", ""), ("phones.myphone", "")]
+    assert ranked("o", "") == [
+        ("laptop", "alice"),
+        ("laptop", "bob"),
+        ("router", "ädmin"),
+        ("goggles", "alice@gogglemail.com"),
+        ("goggles", "bob+spam@gogglemail.com"),
+        ("phones.samson", ""),
+        ("phones.myphone", ""),
+    ]
+    assert ranked("o", "", limit=2) == [("laptop", "alice"), ("laptop", "bob")]
+
+    # users are scored as well
+    assert ranked("", "bob", limit=1) == [("laptop", "bob")]
+    assert ranked("ggl", "bs") == [("goggles", "bob+spam@gogglemail.com")]
+    assert ranked("xyz", "") == ranked("", "xyz") == []
+
+
+def test_search_session(store, monkeypatch):
+    # typing refines the previous results, deleting or replacing characters searches again
+    queries = [
+        ("", ""),
+        ("g", ""),
+        ("go", ""),
+        ("gog", "b"),
+        ("GOGG", "bob"),
+        ("og", "bob"),
+        ("ogx", "bob"),
+        ("p", ""),
+        ("ph", ""),
+    ]
+    expected = [store.search(*query) for query in queries]
+
+    session = SearchSession(store)
+    searches = []
+    iter_indices = store._iter_indices
+    monkeypatch.setattr(
+        store,
+        "_iter_indices",
+        lambda *args: searches.append(args) or iter_indices(*args),
+    )
+    assert [session.search(*query) for query in queries] == expected
+    n = len(store.entries)
+    assert [s[:2] for s in searches if s[3] < n] == [("", ""), ("og", "bob"), ("p", "")]
+
+
+@pytest.mark.parametrize("limit", [None, 1, 2, 3])
+@pytest.mark.parametrize("index", [False, True])
+def test_search_session_limit(store, limit, index):
+    # with a limit, searches stop early and are resumed by later refinements
+    session = SearchSession(Store.load(store.path, index=index))
+    queries = [("", ""), ("o", ""), ("o", "a"), ("", ""), ("e", ""), ("es", "")]
+    queries += [("p", ""), ("ph", ""), ("phones.", ""), ("phones.s", "")]
+    for query in queries:
+        assert session.search(*query, limit=limit) == store.search(*query)[:limit]
+
+
+def test_reloading_store(tmp_path):
+    path = str(tmp_path / "db.pw")
+    with open(path, "w") as fp:
+        fp.write("a: alice 1\n")
+    with ReloadingStore(path, interval=3600, index=True) as store:
+        assert store.get("a") == [Entry("a", "alice", "1", "")]
+        assert not store.reload_if_changed()
+
+        # the previous version is searched until the new one is swapped in
+        previous = store.store
+        with open(path, "a") as fp:
+            fp.write("b: bob 2\n")
+        assert store.store is previous
+        assert store.reload_if_changed()
+        assert store.store is not previous and store.store.index is not None
+        assert store.search("b", "") == [Entry("b", "bob", "2", "")]
+        assert previous.search("b", "") == []
+
+        # files replaced like by pw --edit, as well as journaled changes, are noticed
+        with open(path + ".new", "w") as fp:
+            fp.write("c: carol 3\n")
+        os.replace(path + ".new", path)
+        assert store.reload_if_changed()
+        assert [e.key for e in store.entries] == ["c"]
+        Store.load(path).add("d", "dave", "4")
+        assert store.reload_if_changed()
+        assert store.search_many([("d", ""), ("c", "")]) == [
+            [Entry("d", "dave", "4", "")],
+            [Entry("c", "carol", "3", "")],
+        ]
+
+        # failures to load keep the previous version
+        with open(path, "a") as fp:
+            fp.write("  notes after a blank line\n\n  more notes\n")
+        assert not store.reload_if_changed()
+        assert isinstance(store.error, SyntaxError)
+        assert list(store.iter_search("", "")) == store.search("", "")
+        assert len(store.search("", "")) == 2
+
+
+def test_split_blocks(dirname):
+    src = open(os.path.join(dirname, "db.pw"), encoding="utf-8").read()
+    blocks = _split_blocks(src)
+    assert "\n".join(blocks) == src
+    assert blocks[:4] == [
+        "# single account",
+        "laptop: alice 4l1c3 default user",
+        "laptop: bob b0b\n",
+        "# multiple accounts",
+    ]
+    assert (
+        blocks[4]
+        == "goggles: alice@gogglemail.com 12345 https://mail.goggles.com/\n  second line"
+    )
+    assert _split_blocks("a: b\r\n  c\r\nd: e") == ["a: b\r\n  c\r", "d: e"]
+
+
+@pytest.mark.parametrize("index", [False, True])
+def test_store_reload(tmp_path, dirname, index, monkeypatch):
+    src = open(os.path.join(dirname, "db.pw"), encoding="utf-8").read()
+    path = str(tmp_path / "db.pw")
+
+    def write(src):
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(src)
+
+    write(src)
+    store = Store.load(path, index=index, incremental=True)
+    assert store.entries == Store.load(path).entries
+
+    # only passwords and notes changed: the columns and indices are shared
+    src = src.replace("b0b", "b0b2").replace("  second line\n", "")
+    write(src)
+    parsed = []
+    monkeypatch.setattr(
+        pw.store,
+        "_iter_entries",
+        lambda lines: parsed.append(list(lines)) or _iter_entries(parsed[-1]),
+    )
+    reloaded = store.reload()
+    assert len(parsed) == 2
+    assert reloaded.entries == Store.load(path).entries
+    assert reloaded.keys is store.keys and reloaded.index is store.index
+    assert reloaded.search("laptop", "bob")[0].password == "b0b2"
+    assert store.search("laptop", "bob")[0].password == "b0b"
+
+    # keys changed, blocks moved and were removed
+    edits = [
+        src.replace("phones.samson", "phones.other"),
+        "new: entry\n" + src,
+        src.replace("# single account\n", "").replace("laptop: bob", "laptop: bob\n#"),
+        "\n\n".join(reversed(src.split("\n\n"))),
+        "laptop: alice dup\n" + src + "laptop: alice dup\n",
+        "",
+        src,
+    ]
+    for edit in edits:
+        write(edit)
+        parsed.clear()
+        reloaded = reloaded.reload()
+        assert reloaded.entries == Store.load(path).entries
+        assert list(reloaded.keys) == [e.key for e in reloaded.entries]
+        assert len(parsed) < len(edit.splitlines()) or not edit
+        if index:
+            assert reloaded.index is not None
+            assert reloaded.search("o", "") == Store.load(path).search("o", "")
+
+    # syntax errors are reported like for a full parse
+    write(src + "\n  notes after blank line\n")
+    with pytest.raises(SyntaxError) as e:
+        reloaded.reload()
+    assert e.value.lineno == len(src.splitlines()) + 1
+
+    # only incrementally loaded stores can be reloaded
+    write(src)
+    with pytest.raises(ValueError):
+        Store.load(path).reload()
+
+
+def test_store_reload_identical_blocks(tmp_path):
+    path = str(tmp_path / "db.pw")
+    store = None
+    for src in [
+        "z: u 0\na: u p1\nb: u x\na: u p1\nc: u y\n",
+        "z: u 1\na: u p1\nb: u x\na: u p1\nc: u z\n",
+        "z: u 1\na: u p1\nb: u x\na: u NEW\nc: u z\n",
+    ]:
+        with open(path, "w") as fp:
+            fp.write(src)
+        store = store.reload() if store else Store.load(path, incremental=True)
+        assert store.entries == Store.load(path).entries
+    assert [e.password for e in store.search("a", "")] == ["p1", "NEW"]
+
+
+def test_store_reload_journal(tmp_path, dirname):
+    path = str(tmp_path / "db.pw")
+    shutil.copy(os.path.join(dirname, "db.pw"), path)
+    Store.load(path).add("new", "", "entry")
+    store = Store.load(path, incremental=True)
+    assert store.get("new") == [Entry("new", "", "entry", "")]
+    with open(path, "a") as fp:
+        fp.write("other: entry\n")
+    reloaded = store.reload()
+    assert reloaded.get("new") == [Entry("new", "", "entry", "")]
+    assert reloaded.get("other") == [Entry("other", "", "entry", "")]
+
+
+def test_reloading_store_background(tmp_path):
+    path = str(tmp_path / "db.pw")
+    with open(path, "w") as fp:
+        fp.write("a: alice 1\n")
+    with ReloadingStore(path, interval=0.01) as store:
+        with open(path, "a") as fp:
+            fp.write("b: bob 2\n")
+        deadline = time.monotonic() + 10
+        while not store.search("b", "") and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.search_ranked("b", "") == [Entry("b", "bob", "2", "")]
+    assert not store.thread.is_alive()
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("mail\\.bank", ["mail.bank"]),
+        ("ab+c", ["ab", "c"]),
+        ("a*b", ["b"]),
+        ("ab?cd", ["a", "cd"]),
+        ("ab{2,3}c", ["a", "c"]),
+        ("^lap.*top$", ["lap", "top"]),
+        ("x[]abc]yz", ["x", "yz"]),
+        ("ab\\dcd", ["ab", "cd"]),
+        ("(foo|bar)baz", ["baz"]),
+        ("foo|bar", []),
+        ("(?i)abc", []),
+        ("\\x41bc", []),
+        ("äbc", ["bc"]),
+    ],
+)
+def test_regex_literals(pattern, expected):
+    assert _regex_literals(pattern) == expected
+
+
+@pytest.mark.parametrize(
+    "key_pattern, user_pattern, glob",
+    [
+        ("", "", False),
+        ("^lap", "", False),
+        ("OG+L", "", False),
+        ("s$", "^bob", False),
+        ("(mail|phone)", "", False),
+        ("p.*s\\.s", "", False),
+        ("", "m[ae]", False),
+        ("", "", True),
+        ("phones.*", "", True),
+        ("*O*", "bob", True),
+        ("*o*", "bob*", True),
+        ("[lr]*", "", True),
+        ("goggle?", "*@gogglemail.com", True),
+    ],
+)
+@pytest.mark.parametrize("index", [False, True])
+def test_store_search_patterns(store, key_pattern, user_pattern, glob, index):
+    # compare with matching each entry
+    key_regex = fnmatch.translate(key_pattern) if glob else key_pattern
+    user_regex = fnmatch.translate(user_pattern) if glob else user_pattern
+    match = re.match if glob else re.search
+    expected = [
+        e
+        for e in store.entries
+        if (not key_pattern or match(key_regex, e.key, re.IGNORECASE))
+        and (not user_pattern or match(user_regex, e.user))
+    ]
+    other = Store.load(store.path, index=index)
+    got = other.search(key_pattern, user_pattern, regex=not glob, glob=glob)
     assert got == expected
 
 
+def test_store_search_patterns_invalid(store):
+    with pytest.raises(ValueError):
+        store.search("", "", regex=True, glob=True)
+    with pytest.raises(re.error):
+        store.search("(", "", regex=True)
+
+
 def test_store_search(store):
     # search for key
     got = store.search(key_pattern="oggle", user_pattern="")
@@ -353,3 +860,223 @@ def test_store_search(store):
     got = store.search(key_pattern="oggle", user_pattern="spam")
     expected = [Entry("goggles", "bob+spam@gogglemail.com", "abcde", "")]
     assert got == expected
+
+
+def _parse_entries_shlex(src):
+    """Reference implementation of _parse_entries based on shlex (used up to version 0.14.1)."""
+    from io import StringIO
+    from shlex import shlex
+
+    entries = []
+    state = "expecting entry"
+    for lineno, line in enumerate(src.splitlines()):
+        sline = line.strip()
+        if not sline or line.startswith("#"):
+            state = "expecting entry"
+            continue
+        if line[0] in [" ", "\t"]:
+            if state != "expecting entry or notes":
+                raise SyntaxError(lineno, line, state)
+            notes = entries[-1].notes
+            if notes:
+                notes += "\n"
+            notes += sline
+            entries[-1] = entries[-1]._replace(notes=notes)
+            continue
+        sio = StringIO(line)
+        lexer = shlex(sio, posix=True)
+        lexer.whitespace_split = True
+        try:
+            key = lexer.get_token()
+            user = lexer.get_token()
+            password = lexer.get_token()
+        except ValueError as e:
+            raise SyntaxError(lineno, line, str(e))
+        key = key.rstrip(":")
+        assert key
+        if not user and not password:
+            raise SyntaxError(lineno, line, state)
+        if not password:
+            password = user
+            user = notes = ""
+        else:
+            notes = sio.read().strip()
+        entries.append(Entry(key, user, password, notes))
+        state = "expecting entry or notes"
+    return entries
+
+
+def _parse_outcome(parse, src):
+    try:
+        return parse(src)
+    except SyntaxError as e:
+        return SyntaxError, str(e)
+    except AssertionError:
+        return AssertionError
+
+
+TOKENIZER_CORPUS = r"""
+key pass
+key: user pass
+key:: user pass notes
+key:user pass
+key	user	pass	tabbed  notes	
+key user pass   notes with trailing whitespace   
+key user pass #notes
+key user pass# notes
+key user pa#ss notes
+key user #pass notes
+key # user pass
+key#user pass
+key \#user pass
+"key #" user pass
+'key #' user pass
+key "" pass notes
+key '' pass notes
+key "" ""
+key "" pass ""
+key user ""
+key user "" notes
+key "us"er p'a's"s" notes
+key us\ er pass\ word notes
+key user "pa\"ss" notes
+key user "pa\\ss" notes
+key user "pa\ss" notes
+key user 'pa\ss' notes
+key user "pa\\\"ss\n" notes
+key user pa\"ss notes
+key user "pass"word"" notes
+key user pass "quoted notes" 'more notes' \escaped
+key user "pass
+key user 'pass
+key user "pass\
+key user "pass\"
+key user pass\
+key\
+key user pass notes "unbalanced
+"key
+'key
+"":
+"" pass
+'': pass
+key
+key:
+key: #
+Schlüssel: Benützer Paßwort Notizen
+clé espace user pass
+key user name pass
+key user pass　notes
+キー ユーザー パスワード メモ
+key user pass\x1fnotes
+key\x1fuser pass
+"""
+
+
+@pytest.mark.parametrize(
+    "line",
+    [line.replace("\\x1f", "\x1f") for line in TOKENIZER_CORPUS.strip().splitlines()],
+)
+def test_tokenizer_parity(line):
+    expected = _parse_outcome(_parse_entries_shlex, line)
+    assert _parse_outcome(_parse_entries, line) == expected
+
+    # also parse line with notes
+    src = line + "\n  more\n\tnotes\n"
+    expected = _parse_outcome(_parse_entries_shlex, src)
+    assert _parse_outcome(_parse_entries, src) == expected
+
+
+def test_tokenizer_parity_random():
+    import random
+
+    r = random.Random(42)
+    alphabet = ["a", "b", ":", " ", " ", "\t", "'", '"', "\\", "#", "ä", " "]
+    for _ in range(5000):
+        line = "k" + "".join(r.choice(alphabet) for _ in range(r.randrange(20)))
+        expected = _parse_outcome(_parse_entries_shlex, line)
+        assert _parse_outcome(_parse_entries, line) == expected, line
+
+
+@pytest.mark.parametrize(
+    "key_pattern, user_pattern",
+    [
+        ("", ""),
+        ("oggle", ""),
+        ("goggles", "alice"),
+        ("", "bob"),
+        ("", "gogglemail"),
+        ("lap", "b"),
+        ("Phones.", ""),
+        ("phones.myphone", ""),
+        ("phones.samsonite", ""),
+        ("outer", "ädmin"),
+        ("xyz", ""),
+    ],
+)
+@pytest.mark.parametrize(
+    "options",
+    [
+        dict(index=True),
+        dict(compact=True),
+        dict(index=True, compact=True),
+        dict(lazy=True),
+        dict(index=True, lazy=True),
+    ],
+)
+def test_store_search_options(store, key_pattern, user_pattern, options):
+    other = Store.load(store.path, **options)
+    expected = store.search(key_pattern, user_pattern)
+    assert other.search(key_pattern, user_pattern) == expected
+
+
+def test_compact_entries(store):
+    from pw._compact import CompactEntries
+
+    compact = CompactEntries(store.entries)
+    assert len(compact) == len(store.entries)
+    assert list(compact) == store.entries
+    assert compact[-1] == store.entries[-1]
+    assert compact[1:3] == store.entries[1:3]
+    assert list(compact.keys) == [e.key for e in store.entries]
+    assert list(compact.users) == [e.user for e in store.entries]
+    with pytest.raises(IndexError):
+        compact[len(store.entries)]
+
+
+def _is_subsequence(pattern, string):
+    it = iter(string)
+    return all(c in it for c in pattern)
+
+
+def test_key_string():
+    from pw._index import KeyString
+
+    keys = ["", "a", "ab", "ba", "", "abc", "ä"]
+    key_string = KeyString(keys)
+    assert len(key_string) == len(keys)
+    assert list(key_string) == keys
+    assert [key_string[i] for i in range(-len(keys), len(keys))] == keys + keys
+    for pattern in ["", "a", "b", "ab", "abc", "ä", "x", "a\nb"]:
+        expected = [idx for idx, key in enumerate(keys) if pattern in key]
+        assert list(key_string.find(pattern)) == expected
+    for pattern in ["", "a", "ac", "ba", "abc", "cb", "x", "a\nb"]:
+        expected = [
+            idx for idx, key in enumerate(keys) if _is_subsequence(pattern, key)
+        ]
+        assert list(key_string.find_subsequence(pattern)) == expected
+    with pytest.raises(IndexError):
+        key_string[len(keys)]
+    with pytest.raises(ValueError):
+        KeyString(["multi\nline"])
+
+
+def test_user_table():
+    from pw._index import UserTable
+
+    users = ["a", "b", "a", "", "b", "a"]
+    user_table = UserTable(users)
+    assert len(user_table) == len(users)
+    assert list(user_table) == users
+    assert [user_table[i] for i in range(len(users))] == users
+    assert user_table.distinct == ["a", "b", ""]
+    assert user_table.matches("a") == [True, False, False]
@@ -0,0 +1,98 @@
+import io, json, os.path, threading
+import pytest
+from pw import trace
+from pw.store import Store
+
+
+@pytest.fixture
+def recorder():
+    recorder = trace.Recorder()
+    trace.add_hook(recorder)
+    yield recorder
+    trace.remove_hook(recorder)
+
+
+def test_span(recorder):
+    with trace.span("outer", path="a.pw"):
+        with trace.span("inner"):
+            pass
+    with pytest.raises(ValueError):
+        with trace.span("failing"):
+            raise ValueError()
+
+    assert [(s[0], s[3]) for s in recorder.spans] == [
+        ("inner", {}),
+        ("outer", {"path": "a.pw"}),
+        ("failing", {}),
+    ]
+    (_, inner_start, inner_duration, _, tid), (_, outer_start, outer_duration, _, _) = (
+        recorder.spans[:2]
+    )
+    assert outer_start <= inner_start
+    assert inner_start + inner_duration <= outer_start + outer_duration
+    assert tid == threading.get_ident()
+
+
+def test_iter_span(recorder):
+    it = trace.iter_span("numbers", range(3), kind="test")
+    assert next(it) == 0
+    assert recorder.spans == []
+    assert list(it) == [1, 2]
+    assert [(s[0], s[3]) for s in recorder.spans] == [("numbers", {"kind": "test"})]
+
+    # abandoned iterations are reported as well
+    it = trace.iter_span("abandoned", range(3))
+    next(it)
+    it.close()
+    assert recorder.spans[-1][0] == "abandoned"
+
+
+def test_without_hooks():
+    with trace.span("ignored"):
+        pass
+    it = range(3)
+    assert list(trace.iter_span("ignored", it)) == [0, 1, 2]
+    assert not trace._hooks
+
+
+@pytest.mark.parametrize("filename", ["db.pw", "db.pw.gpg"])
+def test_store_spans(recorder, dirname, filename):
+    path = os.path.join(dirname, filename)
+    store = Store.load(path)
+    store.search("phones", "")
+    list(store.iter_search("phones", ""))
+    store.get("laptop")
+    names = [s[0] for s in recorder.spans]
+    expected = {"gpg.decrypt", "parse"} if filename.endswith(".gpg") else {"parse"}
+    assert set(names[:-4]) == expected and names[-4] == "load"
+    assert names[-3:] == ["search"] * 3
+    assert recorder.spans[-3][3] == {"mode": "substring"}
+    assert recorder.spans[-1][3] == {"mode": "exact"}
+
+    # spans never contain patterns or passwords
+    attrs = [value for s in recorder.spans for value in s[3].values()]
+    assert not {"phones", "laptop", "0000"} & set(attrs)
+
+
+def test_recorder(recorder):
+    recorder("outer", 1.0, 0.5, {"path": "a.pw"})
+    recorder("inner", 1.1, 0.2, {})
+    recorder("next", 1.5, 0.1, {})
+
+    fp = io.StringIO()
+    recorder.write_summary(fp)
+    assert fp.getvalue().splitlines() == [
+        "    500.00ms  outer (path=a.pw)",
+        "    200.00ms    inner",
+        "    100.00ms  next",
+    ]
+
+    fp = io.StringIO()
+    recorder.write_json(fp)
+    events = json.loads(fp.getvalue())["traceEvents"]
+    assert [(e["name"], e["ph"], e["ts"], e["dur"]) for e in events] == [
+        ("outer", "X", 1e6, 5e5),
+        ("inner", "X", 1.1e6, 2e5),
+        ("next", "X", 1.5e6, 1e5),
+    ]
+    assert events[0]["args"] == {"path": "a.pw"}